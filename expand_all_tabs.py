@@ -3,7 +3,8 @@ Expand All Tabs Node for ComfyUI
 Expands ImageFolderPicker list outputs into individual outputs for all 5 tabs
 """
 
-import torch
+# Placeholders for tabs not present in the input lists (shared with the picker)
+from .image_folder_picker import _EMPTY_IMAGE, _EMPTY_MASK
 
 
 class ExpandAllTabs:
@@ -48,39 +49,19 @@ class ExpandAllTabs:
         Returns:
             tuple: (image1-5, mask1-5, filepath1-5)
         """
-        # Create default placeholder values
-        default_image = torch.zeros((1, 64, 64, 3), dtype=torch.float32)
-        default_mask = torch.zeros((1, 64, 64), dtype=torch.float32)
+        # Default placeholder values
+        default_image = _EMPTY_IMAGE
+        default_mask = _EMPTY_MASK
         default_filepath = ""
         
-        # Extract or use defaults
-        def get_or_default(lst, idx, default):
+        # Pad/truncate each input to exactly 5 entries, using defaults for missing tabs
+        def pad(lst, default):
             if lst is None:
-                return default
-            if isinstance(lst, list):
-                return lst[idx] if idx < len(lst) else default
-            else:
-                return lst if idx == 0 else default
+                return [default] * 5
+            if not isinstance(lst, list):
+                lst = [lst]
+            return (lst + [default] * 5)[:5]
         
-        # Extract all 5 tabs
-        image1 = get_or_default(images, 0, default_image)
-        image2 = get_or_default(images, 1, default_image)
-        image3 = get_or_default(images, 2, default_image)
-        image4 = get_or_default(images, 3, default_image)
-        image5 = get_or_default(images, 4, default_image)
-        
-        mask1 = get_or_default(masks, 0, default_mask)
-        mask2 = get_or_default(masks, 1, default_mask)
-        mask3 = get_or_default(masks, 2, default_mask)
-        mask4 = get_or_default(masks, 3, default_mask)
-        mask5 = get_or_default(masks, 4, default_mask)
-        
-        filepath1 = get_or_default(filepaths, 0, default_filepath)
-        filepath2 = get_or_default(filepaths, 1, default_filepath)
-        filepath3 = get_or_default(filepaths, 2, default_filepath)
-        filepath4 = get_or_default(filepaths, 3, default_filepath)
-        filepath5 = get_or_default(filepaths, 4, default_filepath)
-        
-        return (image1, image2, image3, image4, image5,
-                mask1, mask2, mask3, mask4, mask5,
-                filepath1, filepath2, filepath3, filepath4, filepath5)
+        return (*pad(images, default_image),
+                *pad(masks, default_mask),
+                *pad(filepaths, default_filepath))
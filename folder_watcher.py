@@ -18,46 +18,80 @@ except ImportError:
     FileSystemEventHandler = object
     FileSystemEvent = None
 
+# Recursive watches are native on FSEvents (macOS) and ReadDirectoryChangesW (Windows).
+# Elsewhere (inotify) watchdog adds a watch per subdirectory of a recursive root, so
+# nested folders keep their own non-recursive watches there.
+COALESCE_NESTED_WATCHES = Observer is not None and Observer.__name__ in ('FSEventsObserver', 'WindowsApiObserver')
+
 # Valid image extensions to monitor
 VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tiff', '.tif'}
+_VALID_SUFFIXES = tuple(sorted(VALID_EXTENSIONS, key=len, reverse=True))  # For str.endswith
+
+# Access events (watchdog 2.3+/4.0+ on inotify) - opening an image must not count as a change
+_READ_ONLY_EVENTS = frozenset({'opened', 'closed_no_write'})
 
 
 class ImageFolderHandler(FileSystemEventHandler):
-    """Handles file system events for a watched folder."""
+    """
+    Handles file system events for a watch root.
+    With COALESCE_NESTED_WATCHES a root also serves any watched descendant folders
+    (the watch is then recursive);
+    events are dispatched to the folder that directly contains the changed entry.
+    """
     
     def __init__(self, folder_path: str, manager: 'FolderWatcherManager'):
         super().__init__()
         self.folder_path = folder_path
         self.manager = manager
-        self._last_event_time = 0
+        self.folders: Set[str] = {folder_path}  # Logical folders served by this watch
+        self._last_event_time: Dict[str, int] = {}  # folder -> monotonic_ns of last accepted event
         self._pending_notify = False
-        self._debounce_lock = threading.Lock()
     
     def _is_valid_image(self, path: str) -> bool:
         """Check if the file is a valid image type."""
-        ext = os.path.splitext(path)[1].lower()
-        return ext in VALID_EXTENSIONS
+        return path.lower().endswith(_VALID_SUFFIXES)
     
     def _should_process(self, event: 'FileSystemEvent') -> bool:
         """Determine if this event should trigger a notification."""
+        if event.event_type in _READ_ONLY_EVENTS:
+            return False  # Reading a file (e.g. for a listing) changes nothing
         if event.is_directory:
             return True  # Directory changes may affect subfolder list
         return self._is_valid_image(event.src_path)
     
+    def _affected_folders(self, event: 'FileSystemEvent') -> Set[str]:
+        """Get the watched folders whose listing this event changes."""
+        if event.is_directory and event.event_type == 'modified':
+            # Contents of that directory changed, not its parent's listing
+            candidates = {event.src_path}
+        else:
+            paths = [event.src_path]
+            dest_path = getattr(event, 'dest_path', '')
+            if dest_path:
+                paths.append(dest_path)
+            candidates = {os.path.dirname(path) for path in paths}
+            if event.is_directory:
+                candidates.update(paths)
+        return {folder for folder in candidates if folder in self.folders}
+    
     def on_any_event(self, event: 'FileSystemEvent'):
         """Handle any file system event with debouncing."""
         if not self._should_process(event):
             return
         
-        with self._debounce_lock:
-            current_time = time.time()
-            # Debounce: ignore events within 300ms of last event
-            if current_time - self._last_event_time < 0.3:
-                return
-            self._last_event_time = current_time
-        
-        # Schedule notification (with additional debounce via timer)
-        self.manager._schedule_notification(self.folder_path)
+        for folder in self._affected_folders(event):
+            # Every event counts for listing invalidation, debounced or not
+            self.manager._bump_generation(folder)
+            
+            # Debounce: ignore events within 300ms of last event. Lock-free on purpose -
+            # a racing event at worst slips through, and the manager coalesces it anyway.
+            now = time.monotonic_ns()
+            if now - self._last_event_time.get(folder, 0) < 300_000_000:
+                continue
+            self._last_event_time[folder] = now
+            
+            # Schedule notification (with additional debounce in the flusher thread)
+            self.manager._schedule_notification(folder)
 
 
 class FolderWatcherManager:
@@ -76,22 +110,29 @@ class FolderWatcherManager:
             return
         
         self.observer = Observer()
-        self._watches: Dict[str, object] = {}  # folder_path -> watch object
-        self._handlers: Dict[str, ImageFolderHandler] = {}  # folder_path -> handler
+        # Folders nested inside a watched folder share its (then recursive) watch where
+        # the backend watches recursively natively, see COALESCE_NESTED_WATCHES
+        self._watches: Dict[str, object] = {}  # watch root -> watch object
+        self._handlers: Dict[str, ImageFolderHandler] = {}  # watch root -> handler
+        self._roots: Dict[str, str] = {}  # folder_path -> watch root serving it
         self._ref_counts: Dict[str, int] = {}  # folder_path -> reference count
+        self._generations: Dict[str, int] = {}  # folder_path -> change counter, see change_generation
         self._watch_lock = threading.Lock()
         
-        # Notification debouncing
+        # Notification debouncing (drained by a single background flusher thread)
         self._pending_notifications: Set[str] = set()
-        self._notify_timer: Optional[threading.Timer] = None
         self._notify_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
         
         # Pause state (for workflow execution)
         self._paused = False
         self._paused_notifications: Set[str] = set()
         
-        # Start the observer thread
+        # Start the observer and flusher threads
         self.observer.start()
+        self._flusher = threading.Thread(target=self._flush_loop, name="ifp-notify", daemon=True)
+        self._flusher.start()
     
     @classmethod
     def get_instance(cls) -> 'FolderWatcherManager':
@@ -102,6 +143,63 @@ class FolderWatcherManager:
                     cls._instance = cls()
         return cls._instance
     
+    @staticmethod
+    def _is_ancestor(parent: str, child: str) -> bool:
+        """Check if child is strictly inside parent."""
+        try:
+            return parent != child and os.path.commonpath([parent, child]) == parent
+        except ValueError:
+            return False  # Different drives on Windows
+    
+    def _schedule_root(self, root: str, handler: ImageFolderHandler):
+        """(Re)schedule the watch for a root; recursive only if it serves descendants."""
+        recursive = len(handler.folders) > 1
+        old_watch = self._watches.get(root)
+        if old_watch is not None:
+            if old_watch.is_recursive == recursive:
+                return
+            self.observer.unschedule(old_watch)
+        self._watches[root] = self.observer.schedule(handler, root, recursive=recursive)
+        self._handlers[root] = handler
+    
+    def _attach(self, folder_path: str):
+        """Attach a folder to an existing ancestor watch, or make it a new root."""
+        if not COALESCE_NESTED_WATCHES:
+            # One non-recursive watch per folder, sharing only the observer
+            handler = ImageFolderHandler(folder_path, self)
+            self._schedule_root(folder_path, handler)
+            self._roots[folder_path] = folder_path
+            return
+        
+        for root, handler in self._handlers.items():
+            if self._is_ancestor(root, folder_path):
+                handler.folders.add(folder_path)
+                try:
+                    self._schedule_root(root, handler)
+                except Exception:
+                    handler.folders.discard(folder_path)
+                    raise
+                self._roots[folder_path] = root
+                return
+        
+        # New top-level root - absorb any roots nested inside it
+        handler = ImageFolderHandler(folder_path, self)
+        nested = [root for root in self._handlers if self._is_ancestor(folder_path, root)]
+        for root in nested:
+            handler.folders.update(self._handlers[root].folders)
+        self._schedule_root(folder_path, handler)
+        self._roots[folder_path] = folder_path
+        
+        for root in nested:
+            try:
+                self.observer.unschedule(self._watches[root])
+            except Exception as e:
+                print(f"[ImageFolderPicker] Error unwatching {root}: {e}")
+            for folder in self._handlers[root].folders:
+                self._roots[folder] = folder_path
+            del self._watches[root]
+            del self._handlers[root]
+    
     def watch_folder(self, folder_path: str) -> bool:
         """
         Start watching a folder. Uses reference counting for multiple watchers.
@@ -117,16 +215,13 @@ class FolderWatcherManager:
             return False
         
         with self._watch_lock:
-            if folder_path in self._watches:
+            if folder_path in self._ref_counts:
                 # Already watching - increment ref count
-                self._ref_counts[folder_path] = self._ref_counts.get(folder_path, 1) + 1
+                self._ref_counts[folder_path] += 1
                 return True
             
             try:
-                handler = ImageFolderHandler(folder_path, self)
-                watch = self.observer.schedule(handler, folder_path, recursive=False)
-                self._watches[folder_path] = watch
-                self._handlers[folder_path] = handler
+                self._attach(folder_path)
                 self._ref_counts[folder_path] = 1
                 return True
             except Exception as e:
@@ -144,43 +239,67 @@ class FolderWatcherManager:
         folder_path = os.path.normpath(os.path.abspath(folder_path))
         
         with self._watch_lock:
-            if folder_path not in self._watches:
+            if folder_path not in self._ref_counts:
                 return False
             
-            self._ref_counts[folder_path] = self._ref_counts.get(folder_path, 1) - 1
+            self._ref_counts[folder_path] -= 1
+            if self._ref_counts[folder_path] > 0:
+                return True  # Still watching (other references)
             
-            if self._ref_counts[folder_path] <= 0:
-                # No more references - stop watching
-                try:
-                    self.observer.unschedule(self._watches[folder_path])
-                except Exception as e:
-                    print(f"[ImageFolderPicker] Error unwatching {folder_path}: {e}")
-                
-                del self._watches[folder_path]
-                del self._handlers[folder_path]
-                del self._ref_counts[folder_path]
-                return False
+            # No more references - stop watching. Changes go unseen from now on, so
+            # anything keyed on the current generation must not match again.
+            del self._ref_counts[folder_path]
+            self._bump_generation(folder_path)
+            root = self._roots.pop(folder_path)
+            handler = self._handlers[root]
+            handler.folders.discard(folder_path)
             
-            return True  # Still watching (other references)
+            try:
+                if folder_path != root:
+                    # Drop back to a non-recursive watch once no descendants remain
+                    self._schedule_root(root, handler)
+                    return False
+                
+                self.observer.unschedule(self._watches[root])
+                del self._watches[root]
+                del self._handlers[root]
+                
+                # Re-home folders that were served by this root, outermost first
+                for folder in sorted(handler.folders, key=len):
+                    del self._roots[folder]
+                    self._attach(folder)
+            except Exception as e:
+                print(f"[ImageFolderPicker] Error unwatching {folder_path}: {e}")
+            return False
     
     def is_watching(self, folder_path: str) -> bool:
         """Check if a folder is currently being watched."""
         folder_path = os.path.normpath(os.path.abspath(folder_path))
-        return folder_path in self._watches
+        return folder_path in self._ref_counts
+    
+    def change_generation(self, folder_path: str) -> Optional[int]:
+        """
+        Get a counter that changes whenever an event touches the folder's listing.
+        Returns None if the folder is not being watched (changes would go unnoticed).
+        """
+        folder_path = os.path.normpath(os.path.abspath(folder_path))
+        if folder_path not in self._ref_counts:
+            return None
+        return self._generations.get(folder_path, 0)
+    
+    def _bump_generation(self, folder_path: str):
+        """Record a change to a folder's listing."""
+        self._generations[folder_path] = self._generations.get(folder_path, 0) + 1
     
     def get_watched_folders(self) -> list:
         """Get list of all currently watched folders."""
         with self._watch_lock:
-            return list(self._watches.keys())
+            return list(self._ref_counts.keys())
     
     def pause(self):
         """Pause notifications (useful during workflow execution)."""
         with self._notify_lock:
             self._paused = True
-            # Cancel any pending timer
-            if self._notify_timer is not None:
-                self._notify_timer.cancel()
-                self._notify_timer = None
     
     def resume(self):
         """Resume notifications and send any that were queued while paused."""
@@ -190,9 +309,7 @@ class FolderWatcherManager:
             if self._paused_notifications:
                 self._pending_notifications.update(self._paused_notifications)
                 self._paused_notifications.clear()
-                # Schedule sending after short delay
-                self._notify_timer = threading.Timer(0.3, self._send_notifications)
-                self._notify_timer.start()
+                self._wake.set()
     
     @property
     def is_paused(self) -> bool:
@@ -200,7 +317,7 @@ class FolderWatcherManager:
         return self._paused
     
     def _schedule_notification(self, folder_path: str):
-        """Schedule a debounced notification for a folder change."""
+        """Queue a debounced notification for a folder change."""
         with self._notify_lock:
             # If paused, queue for later
             if self._paused:
@@ -208,21 +325,32 @@ class FolderWatcherManager:
                 return
             
             self._pending_notifications.add(folder_path)
-            
-            # Cancel existing timer
-            if self._notify_timer is not None:
-                self._notify_timer.cancel()
-            
-            # Schedule new timer (500ms debounce)
-            self._notify_timer = threading.Timer(0.5, self._send_notifications)
-            self._notify_timer.start()
+        
+        self._wake.set()
+    
+    def _flush_loop(self):
+        """Background loop that sends pending notifications once events settle."""
+        while not self._stopping:
+            self._wake.wait()
+            # Debounce: keep waiting while events arrive within 500ms of each other
+            while not self._stopping:
+                self._wake.clear()
+                if not self._wake.wait(0.5):
+                    break
+            if self._stopping:
+                return
+            self._send_notifications()
     
     def _send_notifications(self):
         """Send all pending notifications via WebSocket."""
         with self._notify_lock:
+            if self._paused:
+                # Paused while waiting - hold these until resume
+                self._paused_notifications.update(self._pending_notifications)
+                self._pending_notifications.clear()
+                return
             folders = list(self._pending_notifications)
             self._pending_notifications.clear()
-            self._notify_timer = None
         
         if not folders:
             return
@@ -230,17 +358,19 @@ class FolderWatcherManager:
         try:
             from server import PromptServer
             
-            for folder in folders:
-                PromptServer.instance.send_sync(
-                    "imagefolderpicker.folder_changed",
-                    {"folder": folder}
-                )
+            # One message for all changed folders instead of one per folder
+            PromptServer.instance.send_sync(
+                "imagefolderpicker.folders_changed",
+                {"folders": folders}
+            )
         except Exception as e:
             print(f"[ImageFolderPicker] Error sending notification: {e}")
     
     def shutdown(self):
         """Stop the observer and clean up."""
         if self.observer is not None:
+            self._stopping = True
+            self._wake.set()
             self.observer.stop()
             self.observer.join(timeout=5)
 
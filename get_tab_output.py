@@ -3,11 +3,13 @@ Get Tab Output Node for ComfyUI
 Extracts a specific tab's output from ImageFolderPicker list outputs
 """
 
-import torch
+import logging
 
-# Console logging for debug
-def log(msg):
-    print(f"[GetTabOutput] {msg}")
+# Fallbacks when the requested tab is missing from the inputs (shared with the picker)
+from .image_folder_picker import _EMPTY_IMAGE, _EMPTY_MASK
+
+# Debug logging; arguments are only formatted when DEBUG is enabled
+logger = logging.getLogger(__name__)
 
 
 class GetTabOutput:
@@ -56,46 +58,49 @@ class GetTabOutput:
         Returns:
             tuple: (image, mask, filepath) for the selected tab
         """
-        log("=" * 50)
-        log(f"get_tab called")
-        log(f"images type: {type(images)}, len: {len(images) if isinstance(images, list) else 'N/A'}")
-        log(f"masks type: {type(masks)}, len: {len(masks) if isinstance(masks, list) else 'N/A'}")
-        log(f"filepaths type: {type(filepaths)}, len: {len(filepaths) if isinstance(filepaths, list) else 'N/A'}")
-        log(f"tab_number type: {type(tab_number)}, value: {tab_number}")
+        logger.debug("[GetTabOutput] get_tab called")
+        logger.debug("[GetTabOutput] images type: %s, len: %s",
+                     type(images), len(images) if isinstance(images, list) else 'N/A')
+        logger.debug("[GetTabOutput] masks type: %s, len: %s",
+                     type(masks), len(masks) if isinstance(masks, list) else 'N/A')
+        logger.debug("[GetTabOutput] filepaths type: %s, len: %s",
+                     type(filepaths), len(filepaths) if isinstance(filepaths, list) else 'N/A')
+        logger.debug("[GetTabOutput] tab_number type: %s, value: %s", type(tab_number), tab_number)
         
         # Extract tab_number from list (INPUT_IS_LIST makes all inputs lists)
         tab_num = tab_number[0] if isinstance(tab_number, list) else tab_number
-        log(f"Extracted tab_num: {tab_num}")
+        logger.debug("[GetTabOutput] Extracted tab_num: %s", tab_num)
         
         # Clamp tab_number to valid range (1-5)
         tab_num = max(1, min(5, tab_num))
         
         # Convert to 0-based index
         idx = tab_num - 1
-        log(f"Extracting index {idx}")
+        logger.debug("[GetTabOutput] Extracting index %s", idx)
         
         # Extract the specific image/mask/filepath from lists
         if isinstance(images, list) and len(images) > idx:
             image = images[idx]
-            log(f"Extracted image from list, shape: {image.shape}")
+            logger.debug("[GetTabOutput] Extracted image from list, shape: %s", image.shape)
         else:
-            image = torch.zeros((1, 64, 64, 3), dtype=torch.float32)
-            log(f"Using default image")
+            image = _EMPTY_IMAGE
+            logger.debug("[GetTabOutput] Using default image")
         
         if masks is not None and isinstance(masks, list) and len(masks) > idx:
             mask = masks[idx]
-            log(f"Extracted mask from list, shape: {mask.shape}")
+            logger.debug("[GetTabOutput] Extracted mask from list, shape: %s", mask.shape)
         else:
-            mask = torch.zeros((1, 64, 64), dtype=torch.float32)
-            log(f"Using default mask")
+            mask = _EMPTY_MASK
+            logger.debug("[GetTabOutput] Using default mask")
         
         if filepaths is not None and isinstance(filepaths, list) and len(filepaths) > idx:
             filepath = filepaths[idx]
-            log(f"Extracted filepath from list: {filepath}")
+            logger.debug("[GetTabOutput] Extracted filepath from list: %s", filepath)
         else:
             filepath = ""
-            log(f"Using empty filepath")
+            logger.debug("[GetTabOutput] Using empty filepath")
         
-        log(f"Returning - image shape: {image.shape}, mask shape: {mask.shape}, filepath: {filepath}")
+        logger.debug("[GetTabOutput] Returning - image shape: %s, mask shape: %s, filepath: %s",
+                     image.shape, mask.shape, filepath)
         
         return (image, mask, filepath)
@@ -5,12 +5,272 @@ Supports 5 tabs for loading 5 different images
 """
 
 import os
+import time
+import atexit
+import logging
+import threading
+import concurrent.futures
 import hashlib
+import struct
+import tempfile
+from collections import OrderedDict
 import torch
 import numpy as np
-from PIL import Image, ImageOps, ImageSequence
+from PIL import Image, ImageOps
 import folder_paths
 
+from .stat_cache import cached_stat
+
+logger = logging.getLogger(__name__)
+
+# Placeholder outputs for empty or missing tabs, shared across calls (never mutated)
+_EMPTY_IMAGE = torch.zeros((1, 64, 64, 3), dtype=torch.float32)
+_EMPTY_MASK = torch.zeros((1, 64, 64), dtype=torch.float32)
+
+# Process-wide pool for node image decoding, shared by all picker nodes (the thumbnail
+# routes use their own pool); PIL releases the GIL while decoding
+DECODE_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 4), thread_name_prefix="ifp-decode"
+)
+
+
+def _shutdown_decode_pool():
+    DECODE_POOL.shutdown(wait=False)
+
+atexit.register(_shutdown_decode_pool)
+
+
+def _env_int(name, default):
+    """Read a non-negative integer setting from the environment."""
+    try:
+        return max(0, int(os.environ.get(name, default)))
+    except ValueError:
+        logger.warning("[ImageFolderPicker] Ignoring invalid %s, using %s", name, default)
+        return default
+
+
+# (path, mtime_ns, size, max_side) -> (image_tensor, mask_tensor), least recently used first.
+# This memory comes on top of ComfyUI's own; either limit set to 0 disables the cache.
+TENSOR_CACHE_MAX_ENTRIES = _env_int("IFP_TENSOR_CACHE_ENTRIES", 32)
+TENSOR_CACHE_MAX_BYTES = _env_int("IFP_TENSOR_CACHE_MB", 512) * 1024 * 1024
+_tensor_cache = OrderedDict()
+_tensor_cache_bytes = 0
+_tensor_cache_lock = threading.Lock()
+
+
+def _tensors_nbytes(tensors):
+    return sum(t.element_size() * t.nelement() for t in tensors)
+
+
+# Downscaled copies for max_side > 0, kept in ComfyUI's temp dir across decode-cache evictions
+PREVIEW_CACHE_FOLDER = 'ifp_thumbs'
+PREVIEW_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_preview_writes = 0
+
+
+def _prepare_image(img, max_side=0):
+    """Select the first frame, decode it and apply EXIF orientation.
+    
+    Decoding happens here via an explicit load(), so callers can close the file
+    right after converting the result.
+    """
+    # Must happen before any pixel access so libjpeg scales during the IDCT
+    if max_side and img.format == 'JPEG':
+        img.draft('RGB', (max_side, max_side))
+    
+    # For animated images (GIF), just use first frame
+    if hasattr(img, 'n_frames') and img.n_frames > 1:
+        img.seek(0)
+    
+    img.load()
+    
+    # Apply EXIF orientation (skipped for identity, exif_transpose would still copy)
+    orientation = img.getexif().get(0x0112, 1)
+    if orientation != 1:
+        try:
+            ImageOps.exif_transpose(img, in_place=True)
+        except TypeError:
+            img = ImageOps.exif_transpose(img)  # Pillow < 9.4 has no in_place
+    
+    return img
+
+
+def _prune_preview_cache(cache_dir):
+    """Delete least recently used previews until the cache fits PREVIEW_CACHE_MAX_BYTES."""
+    try:
+        entries = []
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.webp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= PREVIEW_CACHE_MAX_BYTES:
+                break
+            os.remove(path)
+            total -= size
+    except OSError as e:
+        logger.warning("[ImageFolderPicker] Could not prune preview cache: %s", e)
+
+
+def _load_preview(image_path, mtime_ns, size, max_side):
+    """Get the image downscaled to fit max_side, reusing a cached copy on disk."""
+    global _preview_writes
+    
+    cache_dir = os.path.join(folder_paths.get_temp_directory(), PREVIEW_CACHE_FOLDER)
+    key = hashlib.blake2b(f"{image_path}:{mtime_ns}:{size}:{max_side}".encode(), digest_size=16).hexdigest()
+    cache_path = os.path.join(cache_dir, key + '.webp')
+    
+    try:
+        img = Image.open(cache_path)
+        try:
+            img.load()
+        except BaseException:
+            img.close()
+            raise
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        # Truncated or corrupt cache file - drop it so the next load doesn't hit it again
+        logger.warning("[ImageFolderPicker] Discarding bad cached preview for %s: %s", image_path, e)
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
+    else:
+        try:
+            os.utime(cache_path)  # Bump mtime for LRU pruning
+        except OSError:
+            pass  # e.g. read-only temp dir; the preview itself is fine
+        return img
+    
+    with Image.open(image_path) as src:
+        img = _prepare_image(src, max_side)
+        has_alpha = 'A' in img.getbands() or (img.mode == 'P' and 'transparency' in img.info)
+        # convert() always returns a new image, so the source file can be closed
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+    img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    
+    tmp_path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temp file and rename, so concurrent readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            # Lossless keeps outputs identical to an uncached run; exact keeps RGB under alpha=0
+            img.save(f, 'WEBP', lossless=True, exact=True)
+        os.replace(tmp_path, cache_path)
+        tmp_path = None
+        
+        _preview_writes += 1
+        if _preview_writes % 32 == 1:
+            _prune_preview_cache(cache_dir)
+    except (OSError, ValueError) as e:
+        logger.warning("[ImageFolderPicker] Could not cache preview for %s: %s", image_path, e)
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    
+    return img
+
+
+def _alpha_to_mask(alpha):
+    """Invert a uint8 alpha plane into a float32 mask (ComfyUI: 1.0=transparent/masked)."""
+    # 1 - a/255 in that order, as two in-place passes; (255 - a)/255 is off by an ulp
+    mask = np.empty(alpha.shape, dtype=np.float32)
+    np.divide(alpha, np.float32(255.0), out=mask, dtype=np.float32)
+    np.subtract(np.float32(1.0), mask, out=mask)
+    return torch.from_numpy(mask)
+
+
+def _image_to_tensors(img):
+    """Convert a decoded PIL image into (image_tensor, mask_tensor)."""
+    if img.mode == 'P' and 'transparency' in img.info:
+        # Palette with transparency: expand once and read both color and alpha from it
+        img = img.convert('RGBA')
+    
+    if img.mode == 'RGB':
+        # Common JPEG path - no conversion at all
+        pixels = np.asarray(img)
+        mask = None
+    elif img.mode == 'RGBA':
+        # Slice color and alpha out of one array instead of getchannel() + convert('RGB')
+        rgba = np.asarray(img)
+        pixels = rgba[..., :3]
+        mask = _alpha_to_mask(rgba[..., 3])
+    else:
+        # Other modes (L, LA, CMYK, I;16, ...): take alpha first, then convert to RGB
+        mask = _alpha_to_mask(np.asarray(img.getchannel('A'))) if 'A' in img.getbands() else None
+        pixels = np.asarray(img.convert('RGB'))
+    
+    # np.asarray copies Pillow's pixels once (its __array_interface__ goes through
+    # tobytes()); the cast and scale then run as one pass into the float32 buffer the
+    # tensor will own, with no separate uint8 or float intermediate.
+    out = np.empty((1,) + pixels.shape, dtype=np.float32)
+    np.divide(pixels, np.float32(255.0), out=out[0], dtype=np.float32)
+    image_tensor = torch.from_numpy(out)  # (1, H, W, 3)
+    
+    # Create fallback mask with same dimensions if no alpha
+    if mask is None:
+        h, w = image_tensor.shape[1:3]
+        mask = torch.zeros((h, w), dtype=torch.float32)
+    
+    # Add batch dimension to mask
+    mask_tensor = mask.unsqueeze_(0)  # (1, H, W)
+    
+    return (image_tensor, mask_tensor)
+
+
+def _decode_file(image_path, mtime_ns, size, max_side=0):
+    """Decode an image file into (image_tensor, mask_tensor), bypassing the tensor cache.
+    
+    A non-zero max_side downscales the image to fit within max_side (JPEGs decode
+    at reduced scale via draft mode) and keeps the result in a disk cache.
+    Files are closed as soon as the tensors are built, keeping FD usage bounded.
+    """
+    if max_side:
+        with _load_preview(image_path, mtime_ns, size, max_side) as img:
+            return _image_to_tensors(img)
+    
+    with Image.open(image_path) as src:
+        return _image_to_tensors(_prepare_image(src))
+
+
+def _decode_image(image_path, mtime_ns, size, max_side=0):
+    """Decode an image file into (image_tensor, mask_tensor), served from an LRU cache.
+    
+    mtime_ns and size are part of the cache key, so a modified file misses naturally.
+    Cached tensors are shared between runs and must not be modified in place.
+    """
+    key = (image_path, mtime_ns, size, max_side)
+    with _tensor_cache_lock:
+        cached = _tensor_cache.get(key)
+        if cached is not None:
+            _tensor_cache.move_to_end(key)
+            return cached
+    
+    tensors = _decode_file(image_path, mtime_ns, size, max_side)
+    if not (TENSOR_CACHE_MAX_ENTRIES and TENSOR_CACHE_MAX_BYTES):
+        return tensors
+    
+    global _tensor_cache_bytes
+    with _tensor_cache_lock:
+        if key not in _tensor_cache:
+            _tensor_cache[key] = tensors
+            _tensor_cache_bytes += _tensors_nbytes(tensors)
+        # Evict least recently used entries past either limit (always keep the newest)
+        while len(_tensor_cache) > 1 and (len(_tensor_cache) > TENSOR_CACHE_MAX_ENTRIES
+                                          or _tensor_cache_bytes > TENSOR_CACHE_MAX_BYTES):
+            _, evicted = _tensor_cache.popitem(last=False)
+            _tensor_cache_bytes -= _tensors_nbytes(evicted)
+    return tensors
+
+
+def _resolve_folder(override, connected, widget):
+    """Pick a tab's folder: folderOverride, then the connected input, then the widget."""
+    return override or connected or widget
+
 
 class ImageFolderPicker:
     """
@@ -20,6 +280,11 @@ class ImageFolderPicker:
     
     VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tiff', '.tif'}
     
+    # unique_id -> (resolved selection, monotonic time of last stat, IS_CHANGED result),
+    # reused for IS_CHANGED_WINDOW seconds; expired entries are dropped on each write
+    IS_CHANGED_WINDOW = 1.0
+    _last_key = {}
+    
     @classmethod
     def INPUT_TYPES(cls):
         return {
@@ -56,6 +321,7 @@ class ImageFolderPicker:
                 "folder3_input": ("STRING", {"forceInput": True}),
                 "folder4_input": ("STRING", {"forceInput": True}),
                 "folder5_input": ("STRING", {"forceInput": True}),
+                "max_side": ("INT", {"default": 0, "min": 0, "max": 16384, "forceInput": True}),
                 "selected_image1": ("STRING", {"default": ""}),
                 "selected_image2": ("STRING", {"default": ""}),
                 "selected_image3": ("STRING", {"default": ""}),
@@ -79,74 +345,32 @@ class ImageFolderPicker:
     CATEGORY = "image"
     DESCRIPTION = "Browse folders and pick images from thumbnails. Has 5 tabs, outputting lists of images, masks, and filepaths. Use GetTabOutput node to extract individual tabs."
     
-    def load_image(self, folder, selected_image):
+    def load_image(self, folder, selected_image, max_side=0):
         """Load a single image and return (image_tensor, mask_tensor) tuple.
         
         - image_tensor: (1, H, W, 3) RGB float32
         - mask_tensor: (1, H, W) float32, inverted alpha (1.0=transparent/masked)
+        
+        max_side > 0 downscales the image to fit within max_side.
         """
         if not selected_image or not folder:
             # Return placeholder image and mask
-            return (
-                torch.zeros((1, 64, 64, 3), dtype=torch.float32),
-                torch.zeros((1, 64, 64), dtype=torch.float32)
-            )
+            return (_EMPTY_IMAGE, _EMPTY_MASK)
         
         image_path = os.path.join(folder, selected_image)
         
-        if not os.path.exists(image_path):
-            return (
-                torch.zeros((1, 64, 64, 3), dtype=torch.float32),
-                torch.zeros((1, 64, 64), dtype=torch.float32)
-            )
+        # Usually answered from the stat IS_CHANGED just made for this run
+        stat = cached_stat(image_path)
+        if stat is None:
+            return (_EMPTY_IMAGE, _EMPTY_MASK)
         
         try:
-            img = Image.open(image_path)
-            
-            # For animated images (GIF), just use first frame
-            if hasattr(img, 'n_frames') and img.n_frames > 1:
-                img.seek(0)
-            
-            # Apply EXIF orientation
-            img = ImageOps.exif_transpose(img)
-            
-            # Extract alpha channel before converting to RGB
-            has_alpha = 'A' in img.getbands()
-            if has_alpha:
-                alpha_np = np.array(img.getchannel('A')).astype(np.float32) / 255.0
-                # Invert alpha: ComfyUI mask convention is 1.0=transparent/masked
-                mask = 1.0 - torch.from_numpy(alpha_np)
-            elif img.mode == 'P' and 'transparency' in img.info:
-                # Handle palette images with transparency
-                alpha_np = np.array(img.convert('RGBA').getchannel('A')).astype(np.float32) / 255.0
-                mask = 1.0 - torch.from_numpy(alpha_np)
-            else:
-                # No alpha channel - will create zero mask after we know dimensions
-                mask = None
-            
-            # Convert to RGB for image output
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-            
-            image_np = np.array(img).astype(np.float32) / 255.0
-            image_tensor = torch.from_numpy(image_np).unsqueeze(0)  # (1, H, W, 3)
-            
-            # Create fallback mask with same dimensions if no alpha
-            if mask is None:
-                h, w = image_np.shape[:2]
-                mask = torch.zeros((h, w), dtype=torch.float32)
-            
-            # Add batch dimension to mask
-            mask_tensor = mask.unsqueeze(0)  # (1, H, W)
-            
-            return (image_tensor, mask_tensor)
-            
+            # Cached by (path, mtime, size); outputs are shared with the cache, which is
+            # safe because ComfyUI nodes treat their inputs as read-only
+            return _decode_image(os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, max_side)
         except Exception as e:
-            print(f"[ImageFolderPicker] Error loading {image_path}: {e}")
-            return (
-                torch.zeros((1, 64, 64, 3), dtype=torch.float32),
-                torch.zeros((1, 64, 64), dtype=torch.float32)
-            )
+            logger.exception("[ImageFolderPicker] Error loading %s: %s", image_path, e)
+            return (_EMPTY_IMAGE, _EMPTY_MASK)
     
     def load_selected_images(self, folder1, folder2, folder3, folder4, folder5,
                              folder1_input=None, folder2_input=None, folder3_input=None,
@@ -155,26 +379,37 @@ class ImageFolderPicker:
                              selected_image4="", selected_image5="",
                              folderOverride1="", folderOverride2="", folderOverride3="",
                              folderOverride4="", folderOverride5="",
-                             unique_id=None):
+                             max_side=0, unique_id=None):
         """Load all selected images.
         
         Priority: folderOverride* > folder*_input > folder*
         
+        max_side (optional input) downscales images to fit within it; 0 = full resolution.
+        
         Returns: (image1, image2, image3, image4, image5, mask1, mask2, mask3, mask4, mask5)
         """
         # Folder resolution: folderOverride takes priority (set when navigating subfolders),
         # then connected input, then widget value
-        f1 = folderOverride1 if folderOverride1 else (folder1_input if folder1_input else folder1)
-        f2 = folderOverride2 if folderOverride2 else (folder2_input if folder2_input else folder2)
-        f3 = folderOverride3 if folderOverride3 else (folder3_input if folder3_input else folder3)
-        f4 = folderOverride4 if folderOverride4 else (folder4_input if folder4_input else folder4)
-        f5 = folderOverride5 if folderOverride5 else (folder5_input if folder5_input else folder5)
-        
-        image1, mask1 = self.load_image(f1, selected_image1)
-        image2, mask2 = self.load_image(f2, selected_image2)
-        image3, mask3 = self.load_image(f3, selected_image3)
-        image4, mask4 = self.load_image(f4, selected_image4)
-        image5, mask5 = self.load_image(f5, selected_image5)
+        f1 = _resolve_folder(folderOverride1, folder1_input, folder1)
+        f2 = _resolve_folder(folderOverride2, folder2_input, folder2)
+        f3 = _resolve_folder(folderOverride3, folder3_input, folder3)
+        f4 = _resolve_folder(folderOverride4, folder4_input, folder4)
+        f5 = _resolve_folder(folderOverride5, folder5_input, folder5)
+        
+        # Decode configured tabs concurrently; empty tabs get the placeholder without a
+        # worker hop, and a single configured tab is loaded inline
+        tabs = ((f1, selected_image1), (f2, selected_image2), (f3, selected_image3),
+                (f4, selected_image4), (f5, selected_image5))
+        configured = [i for i, (folder, selected) in enumerate(tabs) if folder and selected]
+        results = [(_EMPTY_IMAGE, _EMPTY_MASK)] * len(tabs)
+        if len(configured) == 1:
+            i = configured[0]
+            results[i] = self.load_image(*tabs[i], max_side)
+        else:
+            futures = {i: DECODE_POOL.submit(self.load_image, *tabs[i], max_side) for i in configured}
+            for i, future in futures.items():
+                results[i] = future.result()
+        (image1, mask1), (image2, mask2), (image3, mask3), (image4, mask4), (image5, mask5) = results
         
         # Build full file paths
         filepath1 = os.path.join(f1, selected_image1) if f1 and selected_image1 else ""
@@ -197,27 +432,50 @@ class ImageFolderPicker:
                    selected_image1="", selected_image2="", selected_image3="",
                    selected_image4="", selected_image5="",
                    folderOverride1="", folderOverride2="", folderOverride3="",
-                   folderOverride4="", folderOverride5="", **kwargs):
-        """Return hash for cache invalidation."""
+                   folderOverride4="", folderOverride5="", unique_id=None, **kwargs):
+        """Return hash for cache invalidation.
+        
+        Results are remembered per node; an unchanged selection is only re-stat'ed
+        once per second.
+        """
         # Folder resolution: folderOverride > input > widget
-        f1 = folderOverride1 if folderOverride1 else (folder1_input if folder1_input else folder1)
-        f2 = folderOverride2 if folderOverride2 else (folder2_input if folder2_input else folder2)
-        f3 = folderOverride3 if folderOverride3 else (folder3_input if folder3_input else folder3)
-        f4 = folderOverride4 if folderOverride4 else (folder4_input if folder4_input else folder4)
-        f5 = folderOverride5 if folderOverride5 else (folder5_input if folder5_input else folder5)
+        f1 = _resolve_folder(folderOverride1, folder1_input, folder1)
+        f2 = _resolve_folder(folderOverride2, folder2_input, folder2)
+        f3 = _resolve_folder(folderOverride3, folder3_input, folder3)
+        f4 = _resolve_folder(folderOverride4, folder4_input, folder4)
+        f5 = _resolve_folder(folderOverride5, folder5_input, folder5)
+        
+        selection = ((f1, selected_image1), (f2, selected_image2), (f3, selected_image3),
+                     (f4, selected_image4), (f5, selected_image5))
+        
+        now = time.monotonic()
+        last = cls._last_key.get(unique_id) if unique_id is not None else None
+        if last is not None and last[0] == selection and now - last[1] < cls.IS_CHANGED_WINDOW:
+            return last[2]
         
-        parts = []
+        # Fixed-size digest, so the key ComfyUI compares stays small for long paths
+        h = hashlib.blake2b(digest_size=16)
+        found = False
         
-        for folder, selected in [(f1, selected_image1), (f2, selected_image2), (f3, selected_image3), (f4, selected_image4), (f5, selected_image5)]:
+        for folder, selected in selection:
             if selected and folder:
                 image_path = os.path.join(folder, selected)
-                if os.path.exists(image_path):
-                    stat = os.stat(image_path)
-                    parts.append(f"{image_path}_{stat.st_mtime}_{stat.st_size}")
+                stat = cached_stat(image_path)
+                if stat is not None:
+                    # NUL can't occur in paths, so it separates entries unambiguously
+                    h.update(image_path.encode('utf-8', 'surrogateescape') + b'\0')
+                    h.update(struct.pack('<qq', stat.st_mtime_ns, stat.st_size))
+                    found = True
         
-        if parts:
-            return "_".join(parts)
-        return float("NaN")
+        result = h.hexdigest() if found else float("NaN")
+        if unique_id is not None:
+            # Prune so removed nodes don't keep their entries for the whole session
+            expired = [key for key, (_, checked, _) in cls._last_key.items()
+                       if now - checked >= cls.IS_CHANGED_WINDOW]
+            for key in expired:
+                del cls._last_key[key]
+            cls._last_key[unique_id] = (selection, now, result)
+        return result
     
     @classmethod
     def VALIDATE_INPUTS(cls, folder1="", folder2="", folder3="", folder4="", folder5="",
@@ -6,7 +6,99 @@ Extracts embedded prompt metadata from PNG files
 import os
 import json
 import re
-from PIL import Image
+import struct
+import zlib
+from collections import OrderedDict
+from json.encoder import encode_basestring_ascii
+
+from .stat_cache import cached_stat
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+# (path, mtime_ns, size) -> extracted result tuple, least recently used first
+PROMPT_CACHE_MAX_ENTRIES = 128
+_prompt_cache = OrderedDict()
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Decompressed size limit for zTXt/iTXt, Pillow's MAX_TEXT_CHUNK (ImageFile.SAFEBLOCK)
+_MAX_TEXT_CHUNK = 1024 * 1024
+
+
+def _loads(text):
+    """Parse JSON with orjson when installed, else the stdlib json module."""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass  # Stdlib json also accepts NaN/Infinity, which json.dumps can write
+    return json.loads(text)
+
+
+# A1111 parameter fields
+_RE_SAMPLER = re.compile(r'Sampler:\s*([^,\n]+)')
+_RE_SCHEDULE = re.compile(r'Schedule type:\s*([^,\n]+)')
+_RE_CFG = re.compile(r'CFG scale:\s*([\d.]+)')
+_RE_SEED = re.compile(r'Seed:\s*(\d+)')
+
+
+def _decompress_text(data):
+    """Inflate a compressed text chunk, refusing output past _MAX_TEXT_CHUNK."""
+    decompressor = zlib.decompressobj()
+    text = decompressor.decompress(data, _MAX_TEXT_CHUNK)
+    if decompressor.unconsumed_tail:
+        raise ValueError("decompressed text chunk too large")
+    return text
+
+
+def _read_png_text(filepath):
+    """Read tEXt/zTXt/iTXt chunks up to the first IDAT without touching pixel data.
+    
+    Decodes text the way Pillow fills img.info. Returns None if the file is not a PNG;
+    raises on malformed chunks so the caller can fall back to Pillow.
+    """
+    info = {}
+    with open(filepath, 'rb') as f:
+        if f.read(8) != _PNG_SIGNATURE:
+            return None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("truncated PNG")
+            length, chunk_type = struct.unpack('>I4s', header)
+            if chunk_type in (b'IDAT', b'IEND'):
+                return info
+            if chunk_type not in (b'tEXt', b'zTXt', b'iTXt'):
+                f.seek(length + 4, os.SEEK_CUR)  # Skip payload and CRC
+                continue
+            data = f.read(length)
+            if len(data) < length:
+                raise ValueError("truncated PNG chunk")
+            f.seek(4, os.SEEK_CUR)  # CRC is not verified
+            
+            keyword, _, value = data.partition(b'\0')
+            keyword = keyword.decode('latin-1')
+            if chunk_type == b'tEXt':
+                info[keyword] = value.decode('latin-1')
+            elif chunk_type == b'zTXt':
+                if value[:1] == b'\0':  # Compression method 0 (zlib) is the only one defined
+                    info[keyword] = _decompress_text(value[1:]).decode('latin-1')
+            else:
+                compressed, method = value[0], value[1]
+                _language, _, rest = value[2:].partition(b'\0')
+                _translated, _, text = rest.partition(b'\0')
+                if compressed:
+                    if method != 0:
+                        continue
+                    text = _decompress_text(text)
+                try:
+                    info[keyword] = text.decode('utf-8')
+                except UnicodeDecodeError:
+                    pass
 
 
 class PNGPromptExtractor:
@@ -46,38 +138,68 @@ class PNGPromptExtractor:
         cfg = ""
         seed = ""
         
-        # Validate input
-        if not filepath or not os.path.exists(filepath) or not filepath.lower().endswith('.png'):
+        # Validate input (the stat doubles as the existence check and the cache key)
+        stat = cached_stat(filepath) if filepath and filepath.lower().endswith('.png') else None
+        if stat is None:
             return {"ui": {"text": ["Invalid or missing PNG file"]}, 
                     "result": (prompt_json, positive_prompt, negative_prompt, sampler, scheduler, cfg, seed)}
         
+        # Unchanged files skip re-reading and re-parsing the metadata
+        cache_key = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+        cached = _prompt_cache.get(cache_key)
+        if cached is not None:
+            _prompt_cache.move_to_end(cache_key)
+            return self._build_output(*cached)
+        
         try:
-            with Image.open(filepath) as img:
-                if img.format != "PNG":
-                    return {"ui": {"text": ["File is not a valid PNG"]}, 
-                            "result": (prompt_json, positive_prompt, negative_prompt, sampler, scheduler, cfg, seed)}
-                
-                # ComfyUI format (JSON workflow)
-                if "prompt" in img.info:
-                    prompt_json = img.info["prompt"]
-                    positive_prompt, negative_prompt = self._extract_comfyui_prompts(prompt_json)
-                    sampler, scheduler, cfg, seed = self._extract_comfyui_params(prompt_json)
-                
-                # A1111/WebUI format (text parameters)
-                elif "parameters" in img.info:
-                    params_text = img.info["parameters"]
-                    prompt_json = json.dumps({"parameters": params_text})
-                    positive_prompt, negative_prompt = self._extract_a1111_prompts(params_text)
-                    sampler, scheduler, cfg, seed = self._extract_a1111_params(params_text)
-                else:
-                    return {"ui": {"text": ["No prompt metadata found in PNG"]}, 
-                            "result": (prompt_json, positive_prompt, negative_prompt, sampler, scheduler, cfg, seed)}
+            # Read the text chunks directly; Pillow remains the fallback for odd files
+            try:
+                info = _read_png_text(filepath)
+            except (ValueError, IndexError, struct.error, zlib.error):
+                info = None
+            
+            if info is None:
+                from PIL import Image  # Only needed for this fallback
+                with Image.open(filepath) as img:
+                    if img.format != "PNG":
+                        return {"ui": {"text": ["File is not a valid PNG"]}, 
+                                "result": (prompt_json, positive_prompt, negative_prompt, sampler, scheduler, cfg, seed)}
+                    info = img.info
+            
+            # ComfyUI format (JSON workflow)
+            if "prompt" in info:
+                prompt_json = info["prompt"]
+                # Parse once for both extractors
+                try:
+                    workflow = _loads(prompt_json)
+                except ValueError:
+                    workflow = None
+                positive_prompt, negative_prompt = self._extract_comfyui_prompts(workflow)
+                sampler, scheduler, cfg, seed = self._extract_comfyui_params(workflow)
+            
+            # A1111/WebUI format (text parameters)
+            elif "parameters" in info:
+                params_text = info["parameters"]
+                # Same output as json.dumps({"parameters": params_text}), escaping only the text
+                prompt_json = '{"parameters": ' + encode_basestring_ascii(params_text) + '}'
+                positive_prompt, negative_prompt = self._extract_a1111_prompts(params_text)
+                sampler, scheduler, cfg, seed = self._extract_a1111_params(params_text)
+            else:
+                return {"ui": {"text": ["No prompt metadata found in PNG"]}, 
+                        "result": (prompt_json, positive_prompt, negative_prompt, sampler, scheduler, cfg, seed)}
                     
         except Exception as e:
             return {"ui": {"text": [f"Error: {str(e)}"]}, 
                     "result": (prompt_json, positive_prompt, negative_prompt, sampler, scheduler, cfg, seed)}
         
-        # Display UI
+        result = (prompt_json, positive_prompt, negative_prompt, sampler, scheduler, cfg, seed)
+        _prompt_cache[cache_key] = result
+        if len(_prompt_cache) > PROMPT_CACHE_MAX_ENTRIES:
+            _prompt_cache.popitem(last=False)
+        return self._build_output(*result)
+    
+    def _build_output(self, prompt_json, positive_prompt, negative_prompt, sampler, scheduler, cfg, seed):
+        """Build the node output, with a short summary for the UI."""
         display_lines = []
         if positive_prompt:
             display_lines.append(f"Pos: {positive_prompt[:80]}..." if len(positive_prompt) > 80 else f"Pos: {positive_prompt}")
@@ -97,20 +219,36 @@ class PNGPromptExtractor:
                 "result": (prompt_json, positive_prompt, negative_prompt, sampler, scheduler, cfg, seed)}
     
     def _extract_a1111_prompts(self, params_text):
-        """Extract positive and negative prompts from A1111 parameters using regex."""
-        # Split at "Negative prompt:" marker
-        neg_match = re.search(r'\nNegative prompt:\s*(.+?)(?=\nSteps:|$)', params_text, re.DOTALL)
-        positive = re.split(r'\nNegative prompt:', params_text, maxsplit=1)[0].strip()
-        negative = neg_match.group(1).strip() if neg_match else ""
+        """Extract positive and negative prompts from A1111 parameters."""
+        # Split once at the "Negative prompt:" marker; the negative runs up to "Steps:"
+        positive, _, rest = params_text.partition('\nNegative prompt:')
+        negative = rest.partition('\nSteps:')[0]
         
-        return (positive, negative)
+        return (positive.strip(), negative.strip())
     
     def _extract_a1111_params(self, params_text):
-        """Extract generation parameters from A1111 metadata using regex."""
-        sampler = re.search(r'Sampler:\s*([^,\n]+)', params_text)
-        scheduler = re.search(r'Schedule type:\s*([^,\n]+)', params_text)
-        cfg = re.search(r'CFG scale:\s*([\d.]+)', params_text)
-        seed = re.search(r'Seed:\s*(\d+)', params_text)
+        """Extract generation parameters from A1111 metadata."""
+        # Settings are the comma-separated "key: value" pairs on the last line starting
+        # with "Steps:" - read them in one pass instead of searching the whole text per field
+        _, found, settings = params_text.rpartition('\nSteps:')
+        if found:
+            fields = {}
+            for pair in ('Steps:' + settings.partition('\n')[0]).split(','):
+                key, sep, value = pair.partition(':')
+                if sep:
+                    fields.setdefault(key.strip(), value.strip())
+            return (
+                fields.get('Sampler', ''),
+                fields.get('Schedule type', ''),
+                fields.get('CFG scale', ''),
+                fields.get('Seed', '')
+            )
+        
+        # No settings line - search the whole text
+        sampler = _RE_SAMPLER.search(params_text)
+        scheduler = _RE_SCHEDULE.search(params_text)
+        cfg = _RE_CFG.search(params_text)
+        seed = _RE_SEED.search(params_text)
         
         return (
             sampler.group(1).strip() if sampler else "",
@@ -119,18 +257,17 @@ class PNGPromptExtractor:
             seed.group(1).strip() if seed else ""
         )
     
-    def _extract_comfyui_prompts(self, prompt_json):
-        """Extract prompts from ComfyUI JSON workflow."""
+    def _extract_comfyui_prompts(self, workflow):
+        """Extract prompts from a parsed ComfyUI workflow."""
         try:
-            workflow = json.loads(prompt_json)
-            
-            # Find conditioning nodes connected to samplers
-            used_positive, used_negative = self._find_used_conditioning_nodes(workflow)
+            # Find conditioning nodes connected to samplers, and the chain links between nodes
+            used_positive, used_negative, encoders, conditioning_next = self._index_workflow(workflow)
             
             # Follow conditioning chains to find actual text nodes
-            actual_positive = {self._follow_conditioning_chain(node_id, workflow) 
+            resolved = {}
+            actual_positive = {self._follow_conditioning_chain(node_id, encoders, conditioning_next, resolved)
                              for node_id in used_positive}
-            actual_negative = {self._follow_conditioning_chain(node_id, workflow) 
+            actual_negative = {self._follow_conditioning_chain(node_id, encoders, conditioning_next, resolved)
                              for node_id in used_negative}
             actual_positive.discard(None)
             actual_negative.discard(None)
@@ -148,16 +285,16 @@ class PNGPromptExtractor:
         except:
             return ("", "")
     
-    def _extract_comfyui_params(self, prompt_json):
-        """Extract generation parameters from ComfyUI JSON workflow."""
+    def _extract_comfyui_params(self, workflow):
+        """Extract generation parameters from a parsed ComfyUI workflow."""
         try:
-            workflow = json.loads(prompt_json)
             sampler = ""
             scheduler = ""
             cfg = ""
             seed = ""
             
-            for node_id, node_data in workflow.items():
+            # One pass over the nodes; key lists are tuple constants, not rebuilt per node
+            for node_data in workflow.values():
                 if not isinstance(node_data, dict):
                     continue
                 
@@ -168,35 +305,46 @@ class PNGPromptExtractor:
                 if not sampler and "sampler_name" in inputs:
                     sampler = str(inputs["sampler_name"])
                 
-                # Scheduler extraction - use regex to match any node with Scheduler in name
-                if not scheduler and re.search(r'Scheduler', class_type, re.IGNORECASE):
-                    for key in ["scheduler", "scheduler_name"]:
+                # Scheduler extraction - any node with Scheduler in name (case-insensitive)
+                if not scheduler and 'scheduler' in class_type.lower():
+                    for key in ("scheduler", "scheduler_name"):
                         if key in inputs:
                             scheduler = str(inputs[key])
                             break
                 
                 # CFG extraction
                 if not cfg:
-                    for key in ["cfg", "guidance", "guidance_scale"]:
+                    for key in ("cfg", "guidance", "guidance_scale"):
                         if key in inputs:
                             cfg = str(inputs[key])
                             break
                 
                 # Seed extraction
                 if not seed:
-                    for key in ["seed", "noise_seed"]:
+                    for key in ("seed", "noise_seed"):
                         if key in inputs:
                             seed = str(inputs[key])
                             break
+                
+                # Nothing left to look for
+                if sampler and scheduler and cfg and seed:
+                    break
             
             return (sampler, scheduler, cfg, seed)
         except:
             return ("", "", "", "")
     
-    def _find_used_conditioning_nodes(self, workflow):
-        """Find which conditioning nodes are actually connected to samplers."""
+    def _index_workflow(self, workflow):
+        """Single pass over the workflow collecting what prompt extraction needs.
+        
+        Returns (used_positive, used_negative, encoders, conditioning_next):
+        conditioning node ids connected to samplers, text encoding node ids, and
+        node_id -> node_id links through "conditioning" inputs.
+        """
         used_positive = set()
         used_negative = set()
+        encoders = set()
+        conditioning_next = {}
         
         for node_id, node_data in workflow.items():
             if not isinstance(node_data, dict):
@@ -205,49 +353,66 @@ class PNGPromptExtractor:
             class_type = node_data.get("class_type", "")
             inputs = node_data.get("inputs", {})
             
-            # Check if this is a sampler node using regex
-            if re.search(r'Sampler|sampler', class_type):
+            # Text encoding nodes end a conditioning chain (TextEncode also covers CLIPTextEncode*)
+            if 'TextEncode' in class_type or 'Text to Conditioning' in class_type:
+                encoders.add(node_id)
+            else:
+                link = inputs.get("conditioning")
+                if isinstance(link, list) and link:
+                    conditioning_next[node_id] = str(link[0])
+            
+            # Check if this is a sampler node
+            if 'Sampler' in class_type or 'sampler' in class_type:
                 # Direct positive/negative
-                if "positive" in inputs and isinstance(inputs["positive"], list):
-                    used_positive.add(str(inputs["positive"][0]))
-                if "negative" in inputs and isinstance(inputs["negative"], list):
-                    used_negative.add(str(inputs["negative"][0]))
+                link = inputs.get("positive")
+                if isinstance(link, list) and link:
+                    used_positive.add(str(link[0]))
+                link = inputs.get("negative")
+                if isinstance(link, list) and link:
+                    used_negative.add(str(link[0]))
                 
                 # Via guider node
-                if "guider" in inputs and isinstance(inputs["guider"], list):
-                    guider_id = str(inputs["guider"][0])
-                    if guider_id in workflow:
-                        guider_inputs = workflow[guider_id].get("inputs", {})
+                link = inputs.get("guider")
+                if isinstance(link, list) and link:
+                    guider = workflow.get(str(link[0]))
+                    if guider is not None:
+                        guider_inputs = guider.get("inputs", {})
                         cond = guider_inputs.get("conditioning") or guider_inputs.get("positive")
-                        if isinstance(cond, list):
+                        if isinstance(cond, list) and cond:
                             used_positive.add(str(cond[0]))
-                        if "negative" in guider_inputs and isinstance(guider_inputs["negative"], list):
-                            used_negative.add(str(guider_inputs["negative"][0]))
+                        link = guider_inputs.get("negative")
+                        if isinstance(link, list) and link:
+                            used_negative.add(str(link[0]))
         
-        return (used_positive, used_negative)
+        return (used_positive, used_negative, encoders, conditioning_next)
     
-    def _follow_conditioning_chain(self, node_id, workflow, visited=None):
-        """Follow conditioning references to find the actual text encoding node."""
-        if visited is None:
-            visited = set()
-        if node_id in visited or node_id not in workflow:
-            return None
-        visited.add(node_id)
-        
-        node_data = workflow[node_id]
-        class_type = node_data.get("class_type", "")
-        inputs = node_data.get("inputs", {})
-        
-        # If this is a text encoding node, return it - use regex
-        if re.search(r'CLIPTextEncode|Text to Conditioning|TextEncode', class_type):
-            return node_id
+    def _follow_conditioning_chain(self, node_id, encoders, conditioning_next, resolved):
+        """Follow conditioning references to find the actual text encoding node.
         
-        # Follow conditioning input
-        if "conditioning" in inputs and isinstance(inputs["conditioning"], list):
-            next_node = str(inputs["conditioning"][0])
-            return self._follow_conditioning_chain(next_node, workflow, visited)
+        resolved memoizes the result for every node passed through, so chains shared
+        by several samplers are only walked once.
+        """
+        path = []
+        visited = set()
+        while node_id not in resolved:
+            if node_id in visited:  # Cycle
+                result = None
+                break
+            visited.add(node_id)
+            path.append(node_id)
+            if node_id in encoders:
+                result = node_id
+                break
+            if node_id not in conditioning_next:
+                result = None
+                break
+            node_id = conditioning_next[node_id]
+        else:
+            result = resolved[node_id]
         
-        return None
+        for passed in path:
+            resolved[passed] = result
+        return result
     
     def _extract_text_from_node(self, node_id, workflow):
         """Extract text from a text encoding node."""
@@ -258,7 +423,7 @@ class PNGPromptExtractor:
         inputs = node_data.get("inputs", {})
         
         # Try common text field names
-        for key in ["text", "user_prompt", "prompt", "positive", "system_prompt"]:
+        for key in ("text", "user_prompt", "prompt", "positive", "system_prompt"):
             if key in inputs:
                 value = inputs[key]
                 if isinstance(value, str):
@@ -268,7 +433,7 @@ class PNGPromptExtractor:
                     ref_id = str(value[0])
                     if ref_id in workflow:
                         ref_inputs = workflow[ref_id].get("inputs", {})
-                        for ref_key in ["value", "text", "string"]:
+                        for ref_key in ("value", "text", "string"):
                             if ref_key in ref_inputs and isinstance(ref_inputs[ref_key], str):
                                 return ref_inputs[ref_key]
         
@@ -4,14 +4,48 @@ Provides API endpoints for listing folder contents and serving thumbnails.
 """
 
 import os
-import hashlib
+import atexit
+import concurrent.futures
+import functools
+import operator
+import struct
+import threading
+from collections import OrderedDict
 from io import BytesIO
+import numpy as np
 from PIL import Image
 
+from .image_folder_picker import _prepare_image
+
 VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tiff', '.tif'}
+_VALID_SUFFIXES = tuple(sorted(VALID_EXTENSIONS, key=len, reverse=True))  # For str.endswith
 THUMBNAIL_SIZE = (128, 128)
 THUMBNAIL_SIZES = {128, 256, 346, 478, 512}  # Allowed thumbnail sizes
 THUMBS_FOLDER = '.thumbs'
+THUMBNAIL_REDUCING_GAP = 2  # JPEG draft scale relative to the thumbnail size
+
+# Thumbnails get their own small pool so gallery loads and bulk refreshes never queue
+# ahead of node decodes on DECODE_POOL (which the prompt worker waits on)
+THUMBNAIL_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=min(2, os.cpu_count() or 2), thread_name_prefix="ifp-thumb"
+)
+
+
+def _shutdown_thumbnail_pool():
+    THUMBNAIL_POOL.shutdown(wait=False)
+
+atexit.register(_shutdown_thumbnail_pool)
+
+# folder -> (dir mtime_ns, image count), least recently used first; directory mtime
+# changes on create/delete
+COUNT_CACHE_MAX_ENTRIES = 256
+_count_cache = OrderedDict()
+_count_cache_lock = threading.Lock()
+
+# (folder, sort) -> (dir mtime_ns, watcher generation, response), least recently used first
+LIST_CACHE_MAX_ENTRIES = 64
+_list_cache = OrderedDict()
+_list_cache_lock = threading.Lock()
 
 
 def get_thumbnail_path(folder, filename, size=128):
@@ -27,27 +61,40 @@ def get_thumbnail_path(folder, filename, size=128):
     return thumbs_dir, os.path.join(thumbs_dir, thumb_filename)
 
 
+@functools.lru_cache(maxsize=256)
+def _real_folder(folder):
+    """realpath of a browsed folder; folders rarely change targets, so it is resolved once."""
+    return os.path.realpath(folder)
+
+
+def escapes_folder(folder, filename):
+    """Check if folder/filename would resolve outside folder (via .., absolute paths or symlinks)."""
+    # Reject traversal outright, without touching the filesystem
+    if os.path.isabs(filename) or os.path.splitdrive(filename)[0]:
+        return True
+    if '..' in filename.replace('\\', '/').split('/'):
+        return True
+    
+    # Symlinks inside the folder may still point elsewhere, so the image is always resolved
+    real_folder = _real_folder(folder)
+    real_image = os.path.realpath(os.path.join(folder, filename))
+    return not real_image.startswith(os.path.join(real_folder, ''))
+
+
 def create_checker_background(size, checker_size=8):
     """Create a checkered background image for transparency indication."""
     width, height = size
-    background = Image.new('RGB', (width, height))
     
     # Light and dark checker colors (typical Photoshop-style)
-    light = (204, 204, 204)  # #cccccc
-    dark = (153, 153, 153)   # #999999
-    
-    for y in range(0, height, checker_size):
-        for x in range(0, width, checker_size):
-            # Determine checker color based on position
-            is_light = ((x // checker_size) + (y // checker_size)) % 2 == 0
-            color = light if is_light else dark
-            
-            # Fill the checker square
-            for dy in range(min(checker_size, height - y)):
-                for dx in range(min(checker_size, width - x)):
-                    background.putpixel((x + dx, y + dy), color)
+    colors = np.array([
+        (204, 204, 204),  # #cccccc - light
+        (153, 153, 153),  # #999999 - dark
+    ], dtype=np.uint8)
+    
+    # Checker parity per pixel (0 = light, 1 = dark), built by broadcasting row and column indices
+    parity = (np.arange(height)[:, None] // checker_size + np.arange(width)[None, :] // checker_size) & 1
     
-    return background
+    return Image.fromarray(colors[parity], 'RGB')
 
 
 def generate_thumbnail(image_path, thumb_path, size=128):
@@ -61,9 +108,10 @@ def generate_thumbnail(image_path, thumb_path, size=128):
         
         # Open and create thumbnail
         with Image.open(image_path) as img:
-            # Handle EXIF orientation
-            from PIL import ImageOps
-            img = ImageOps.exif_transpose(img)
+            # JPEG draft decode at reduced scale (2x the target, like thumbnail()'s
+            # reducing_gap, so LANCZOS still has detail to work with), then EXIF
+            # orientation on the small image
+            img = _prepare_image(img, size * THUMBNAIL_REDUCING_GAP)
             
             # Create thumbnail maintaining aspect ratio first
             img.thumbnail(thumb_size, Image.Resampling.LANCZOS)
@@ -80,8 +128,9 @@ def generate_thumbnail(image_path, thumb_path, size=128):
                 checker_size = max(4, size // 16)  # Scale checker size with thumbnail
                 background = create_checker_background(img.size, checker_size)
                 
-                # Composite image over checkered background
-                background.paste(img, mask=img.split()[-1])
+                # Composite image over checkered background (an RGBA mask uses its alpha band,
+                # so no split() copies are needed)
+                background.paste(img, mask=img)
                 img = background
             elif img.mode != 'RGB':
                 img = img.convert('RGB')
@@ -95,6 +144,19 @@ def generate_thumbnail(image_path, thumb_path, size=128):
         return False
 
 
+def render_thumbnail(image_path, size=128):
+    """Render a thumbnail to JPEG bytes without saving it."""
+    with Image.open(image_path) as img:
+        img = _prepare_image(img, size * THUMBNAIL_REDUCING_GAP)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.thumbnail((size, size), Image.Resampling.LANCZOS)
+        
+        buffer = BytesIO()
+        img.save(buffer, 'JPEG', quality=85)
+        return buffer.getvalue()
+
+
 def is_thumbnail_valid(image_path, thumb_path):
     """Check if thumbnail exists and is up-to-date."""
     if not os.path.exists(thumb_path):
@@ -107,6 +169,218 @@ def is_thumbnail_valid(image_path, thumb_path):
     return thumb_mtime >= image_mtime
 
 
+def refresh_thumbnail(image_path, thumb_path, skip_valid=False):
+    """Regenerate a thumbnail (with skip_valid, only if outdated); returns None if skipped."""
+    try:
+        if skip_valid and is_thumbnail_valid(image_path, thumb_path):
+            return None
+    except OSError:
+        pass  # Let generate_thumbnail report the missing image
+    return generate_thumbnail(image_path, thumb_path)
+
+
+# JPEG start-of-frame markers (C0-CF except DHT, JPG and DAC), which carry the size
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _read_jpeg_size(f):
+    """Walk JPEG marker segments up to the first SOF and return (width, height)."""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte == b'\xff':  # Skip fill bytes before the marker code
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0xD8 or 0xD0 <= marker <= 0xD7:
+            continue  # Standalone markers without a length
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        length = struct.unpack('>H', header)[0]
+        if marker in _JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack('>xHH', data)
+            return (width, height)
+        if marker == 0xDA or length < 2:
+            return None  # Image data reached without a frame header
+        f.seek(length - 2, os.SEEK_CUR)
+        if f.read(1) != b'\xff':
+            return None
+        f.seek(-1, os.SEEK_CUR)
+
+
+def read_image_size(path):
+    """Read (width, height) from the file header of PNG, JPEG, GIF and WebP images.
+    
+    Matches what Pillow reports as img.size without building an image object.
+    Returns None for other formats or unexpected headers, so callers can fall back
+    to Pillow.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(30)
+        if head[:8] == b'\x89PNG\r\n\x1a\n' and head[12:16] == b'IHDR' and len(head) >= 24:
+            return struct.unpack('>II', head[16:24])
+        if head[:2] == b'\xff\xd8':
+            return _read_jpeg_size(f)
+        if head[:6] in (b'GIF87a', b'GIF89a') and len(head) >= 10:
+            return struct.unpack('<HH', head[6:10])
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP' and len(head) == 30:
+            chunk = head[12:16]
+            if chunk == b'VP8X':
+                width = int.from_bytes(head[24:27], 'little') + 1
+                height = int.from_bytes(head[27:30], 'little') + 1
+                return (width, height)
+            if chunk == b'VP8 ' and head[23:26] == b'\x9d\x01\x2a':
+                width, height = struct.unpack('<HH', head[26:30])
+                return (width & 0x3FFF, height & 0x3FFF)
+            if chunk == b'VP8L' and head[20] == 0x2F:
+                bits = int.from_bytes(head[21:25], 'little')
+                return ((bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    return None
+
+
+def _listing_generation(folder):
+    """Watcher change counter for a folder, or None if it isn't watched.
+    
+    The directory mtime misses files rewritten in place, so listings are only
+    cached for watched folders, where every file event bumps the counter.
+    """
+    try:
+        from .folder_watcher import FolderWatcherManager
+    except ImportError:
+        return None
+    manager = FolderWatcherManager._instance
+    if manager is None or manager.observer is None:
+        return None
+    return manager.change_generation(folder)
+
+
+def count_images(folder):
+    """Count images in a folder, reusing the last count while the folder is unchanged."""
+    dir_mtime = os.stat(folder).st_mtime_ns
+    with _count_cache_lock:
+        cached = _count_cache.get(folder)
+        if cached is not None and cached[0] == dir_mtime:
+            _count_cache.move_to_end(folder)
+            return cached[1]
+    
+    # scandir's DirEntry.is_dir() uses the type from the directory read - no extra stat
+    with os.scandir(folder) as entries:
+        count = sum(
+            1 for entry in entries
+            if entry.name.lower().endswith(_VALID_SUFFIXES) and not entry.is_dir()
+        )
+    
+    with _count_cache_lock:
+        _count_cache[folder] = (dir_mtime, count)
+        _count_cache.move_to_end(folder)
+        if len(_count_cache) > COUNT_CACHE_MAX_ENTRIES:
+            _count_cache.popitem(last=False)
+    return count
+
+
+def scan_folder(folder, sort_by="name"):
+    """Read a folder's images and subfolders into a listing response."""
+    images = []
+    subfolders = []
+    
+    # scandir gives the entry type from the directory read, so only entries we
+    # keep are stat'ed (and DirEntry.stat() needs no extra call on Windows)
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            filename = entry.name
+            
+            # Check for subfolders (skip hidden folders)
+            if entry.is_dir():
+                if not filename.startswith('.'):
+                    subfolders.append({
+                        "name": filename,
+                        "path": entry.path,
+                        "modified": entry.stat().st_mtime,
+                        "type": "folder"
+                    })
+                continue
+            
+            ext = os.path.splitext(filename)[1].lower()
+            if ext in VALID_EXTENSIONS and entry.is_file():
+                stat = entry.stat()
+                # Get image dimensions (from the header; Pillow for other formats)
+                width, height = 0, 0
+                try:
+                    dims = read_image_size(entry.path)
+                    if dims is None:
+                        with Image.open(entry.path) as img:
+                            dims = img.size
+                    width, height = dims
+                except:
+                    pass
+                images.append({
+                    "filename": filename,
+                    "size": stat.st_size,
+                    "modified": stat.st_mtime,
+                    "width": width,
+                    "height": height,
+                    "type": "image"
+                })
+    
+    # Sort subfolders by name
+    subfolders.sort(key=lambda x: x["name"].lower())
+    
+    # Sort images based on parameter (itemgetter fetches the key without a Python call)
+    if sort_by == "date_asc":
+        images.sort(key=operator.itemgetter("modified"))
+    elif sort_by == "date_desc":
+        images.sort(key=operator.itemgetter("modified"), reverse=True)
+    else:  # Default: name (alphabetical)
+        images.sort(key=lambda x: x["filename"].lower())
+    
+    # Get parent folder path
+    parent = os.path.dirname(folder)
+    if parent == folder:  # At root
+        parent = ""
+    
+    return {
+        "folder": folder,
+        "parent": parent,
+        "subfolders": subfolders,
+        "images": images,
+        "count": len(images),
+        "sort": sort_by
+    }
+
+
+def list_folder(folder, sort_by="name"):
+    """Get a folder listing, served from _list_cache while the folder is unchanged."""
+    cache_key = (folder, sort_by)
+    generation = _listing_generation(folder)
+    try:
+        dir_mtime = os.stat(folder).st_mtime_ns
+    except OSError:
+        generation = None
+    if generation is not None:
+        with _list_cache_lock:
+            cached = _list_cache.get(cache_key)
+            if cached is not None and cached[:2] == (dir_mtime, generation):
+                _list_cache.move_to_end(cache_key)
+                return cached[2]
+    
+    response = scan_folder(folder, sort_by)
+    
+    # Stored under the generation read before scanning, so an event during the
+    # scan leaves the entry stale rather than hiding the change
+    if generation is not None:
+        with _list_cache_lock:
+            _list_cache[cache_key] = (dir_mtime, generation, response)
+            _list_cache.move_to_end(cache_key)
+            if len(_list_cache) > LIST_CACHE_MAX_ENTRIES:
+                _list_cache.popitem(last=False)
+    return response
+
+
 def register_routes():
     """Register API routes with ComfyUI server."""
     try:
@@ -116,6 +390,8 @@ def register_routes():
         print("[ImageFolderPicker] Could not import server modules")
         return
     
+    import asyncio
+    
     routes = PromptServer.instance.routes
     
     @routes.get("/imagefolderpicker/list")
@@ -130,73 +406,13 @@ def register_routes():
         if not os.path.isdir(folder):
             return web.json_response({"error": "Invalid folder path"}, status=400)
         
-        images = []
-        subfolders = []
-        
         try:
-            for filename in os.listdir(folder):
-                file_path = os.path.join(folder, filename)
-                
-                # Check for subfolders (skip hidden folders)
-                if os.path.isdir(file_path) and not filename.startswith('.'):
-                    stat = os.stat(file_path)
-                    subfolders.append({
-                        "name": filename,
-                        "path": file_path,
-                        "modified": stat.st_mtime,
-                        "type": "folder"
-                    })
-                    continue
-                
-                ext = os.path.splitext(filename)[1].lower()
-                if ext in VALID_EXTENSIONS:
-                    if os.path.isfile(file_path):
-                        stat = os.stat(file_path)
-                        # Get image dimensions
-                        width, height = 0, 0
-                        try:
-                            with Image.open(file_path) as img:
-                                width, height = img.size
-                        except:
-                            pass
-                        images.append({
-                            "filename": filename,
-                            "size": stat.st_size,
-                            "modified": stat.st_mtime,
-                            "width": width,
-                            "height": height,
-                            "type": "image"
-                        })
-            
-            # Sort subfolders by name
-            subfolders.sort(key=lambda x: x["name"].lower())
-            
-            # Sort images based on parameter
-            if sort_by == "date_asc":
-                images.sort(key=lambda x: x["modified"])
-            elif sort_by == "date_desc":
-                images.sort(key=lambda x: x["modified"], reverse=True)
-            else:  # Default: name (alphabetical)
-                images.sort(key=lambda x: x["filename"].lower())
-            
-            # Get parent folder path
-            parent = os.path.dirname(folder)
-            if parent == folder:  # At root
-                parent = ""
-                
+            response = list_folder(folder, sort_by)
         except PermissionError:
             return web.json_response({"error": "Permission denied"}, status=403)
         except Exception as e:
             return web.json_response({"error": str(e)}, status=500)
-        
-        return web.json_response({
-            "folder": folder,
-            "parent": parent,
-            "subfolders": subfolders,
-            "images": images,
-            "count": len(images),
-            "sort": sort_by
-        })
+        return web.json_response(response)
     
     @routes.get("/imagefolderpicker/thumbnail")
     async def get_thumbnail(request):
@@ -222,46 +438,29 @@ def register_routes():
             return web.json_response({"error": "Image not found"}, status=404)
         
         # Security check - ensure filename doesn't escape folder
-        real_folder = os.path.realpath(folder)
-        real_image = os.path.realpath(image_path)
-        if not real_image.startswith(real_folder):
+        if escapes_folder(folder, filename):
             return web.json_response({"error": "Invalid path"}, status=403)
         
         # Get thumbnail path with size
         _, thumb_path = get_thumbnail_path(folder, filename, size)
         
-        # Generate thumbnail if needed
+        # Generate thumbnail if needed (on the thumbnail pool, off the event loop)
         if not is_thumbnail_valid(image_path, thumb_path):
-            if not generate_thumbnail(image_path, thumb_path, size):
-                # Fallback: return original image resized on-the-fly
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(THUMBNAIL_POOL, generate_thumbnail, image_path, thumb_path, size):
+                # Fallback: return original image resized on-the-fly (also off the event loop)
                 try:
-                    with Image.open(image_path) as img:
-                        from PIL import ImageOps
-                        img = ImageOps.exif_transpose(img)
-                        if img.mode != 'RGB':
-                            img = img.convert('RGB')
-                        img.thumbnail((size, size), Image.Resampling.LANCZOS)
-                        
-                        buffer = BytesIO()
-                        img.save(buffer, 'JPEG', quality=85)
-                        buffer.seek(0)
-                        
-                        return web.Response(
-                            body=buffer.read(),
-                            content_type='image/jpeg'
-                        )
+                    body = await loop.run_in_executor(THUMBNAIL_POOL, render_thumbnail, image_path, size)
+                    return web.Response(body=body, content_type='image/jpeg')
                 except Exception as e:
                     return web.json_response({"error": str(e)}, status=500)
         
-        # Return cached thumbnail
-        try:
-            with open(thumb_path, 'rb') as f:
-                return web.Response(
-                    body=f.read(),
-                    content_type='image/jpeg'
-                )
-        except Exception as e:
-            return web.json_response({"error": str(e)}, status=500)
+        # Return cached thumbnail (sendfile where available; the URL isn't versioned, so
+        # browsers revalidate each time and get a 304 while the thumbnail is unchanged)
+        return web.FileResponse(thumb_path, headers={
+            'Content-Type': 'image/jpeg',
+            'Cache-Control': 'no-cache',
+        })
     
     @routes.get("/imagefolderpicker/image")
     async def get_full_image(request):
@@ -278,9 +477,7 @@ def register_routes():
             return web.json_response({"error": "Image not found"}, status=404)
         
         # Security check - ensure filename doesn't escape folder
-        real_folder = os.path.realpath(folder)
-        real_image = os.path.realpath(image_path)
-        if not real_image.startswith(real_folder):
+        if escapes_folder(folder, filename):
             return web.json_response({"error": "Invalid path"}, status=403)
         
         # Determine content type based on extension
@@ -297,43 +494,43 @@ def register_routes():
         }
         content_type = content_types.get(ext, 'application/octet-stream')
         
-        try:
-            with open(image_path, 'rb') as f:
-                return web.Response(
-                    body=f.read(),
-                    content_type=content_type
-                )
-        except Exception as e:
-            return web.json_response({"error": str(e)}, status=500)
+        return web.FileResponse(image_path, headers={
+            'Content-Type': content_type,
+            'Cache-Control': 'no-cache',
+        })
     
     @routes.post("/imagefolderpicker/refresh")
     async def refresh_thumbnails(request):
-        """Regenerate all thumbnails in a folder."""
+        """Regenerate all thumbnails in a folder ("skip_valid": true keeps up-to-date ones)."""
         try:
             data = await request.json()
             folder = data.get("folder", "")
+            skip_valid = bool(data.get("skip_valid", False))
         except:
             return web.json_response({"error": "Invalid request"}, status=400)
         
         if not folder or not os.path.isdir(folder):
             return web.json_response({"error": "Invalid folder"}, status=400)
         
-        regenerated = 0
-        errors = 0
-        
+        # Check and generate concurrently on the thumbnail pool (Pillow releases the GIL
+        # while resampling and encoding), keeping the event loop free meanwhile
+        loop = asyncio.get_running_loop()
+        tasks = []
         for filename in os.listdir(folder):
             ext = os.path.splitext(filename)[1].lower()
             if ext in VALID_EXTENSIONS:
                 image_path = os.path.join(folder, filename)
                 _, thumb_path = get_thumbnail_path(folder, filename)
-                
-                if generate_thumbnail(image_path, thumb_path):
-                    regenerated += 1
-                else:
-                    errors += 1
+                tasks.append(loop.run_in_executor(THUMBNAIL_POOL, refresh_thumbnail, image_path, thumb_path, skip_valid))
+        
+        results = await asyncio.gather(*tasks)
+        regenerated = results.count(True)
+        skipped = results.count(None)
+        errors = len(results) - regenerated - skipped
         
         return web.json_response({
             "regenerated": regenerated,
+            "skipped": skipped,
             "errors": errors
         })
     
@@ -353,9 +550,7 @@ def register_routes():
         image_path = os.path.join(folder, filename)
         
         # Security check - ensure filename doesn't escape folder (prevent directory traversal)
-        real_folder = os.path.realpath(folder)
-        real_image = os.path.realpath(image_path)
-        if not real_image.startswith(real_folder):
+        if escapes_folder(folder, filename):
             return web.json_response({"error": "Invalid path"}, status=403)
         
         if not os.path.exists(image_path):
@@ -437,10 +632,7 @@ def register_routes():
         # Count images in current folder
         image_count = 0
         try:
-            for name in os.listdir(current):
-                ext = os.path.splitext(name)[1].lower()
-                if ext in VALID_EXTENSIONS:
-                    image_count += 1
+            image_count = count_images(current)
         except:
             pass
         
@@ -0,0 +1,39 @@
+"""
+Shared os.stat cache for ComfyUI-ImageFolderPicker
+ComfyUI re-checks IS_CHANGED often; a short TTL collapses repeated stats of the
+same file (expensive on network shares) while still noticing changes promptly.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+STAT_TTL = 0.25
+STAT_CACHE_MAX_ENTRIES = 1024
+
+# path -> (monotonic time, os.stat_result or None), least recently used first
+_stat_cache = OrderedDict()
+_stat_lock = threading.Lock()  # Callers include the decode pool threads
+
+
+def cached_stat(path):
+    """os.stat with a short TTL; returns None if the file is missing."""
+    now = time.monotonic()
+    with _stat_lock:
+        entry = _stat_cache.get(path)
+        if entry is not None and now - entry[0] < STAT_TTL:
+            _stat_cache.move_to_end(path)
+            return entry[1]
+    
+    try:
+        stat = os.stat(path)
+    except OSError:
+        stat = None
+    
+    with _stat_lock:
+        _stat_cache[path] = (now, stat)
+        _stat_cache.move_to_end(path)
+        if len(_stat_cache) > STAT_CACHE_MAX_ENTRIES:
+            _stat_cache.popitem(last=False)
+    return stat
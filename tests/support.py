@@ -0,0 +1,35 @@
+"""
+Shared helpers for the ComfyUI-ImageFolderPicker tests
+"""
+
+import importlib
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = "imagefolderpicker"
+
+
+def import_node_module(name):
+    """Import one of the node modules as part of the package, without running
+    __init__ (which registers routes with a running ComfyUI server)."""
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [ROOT]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+
+def use_temp_folder_paths(temp_dir):
+    """Point folder_paths.get_temp_directory() at temp_dir.
+    
+    Inside a ComfyUI checkout the real module is patched; standalone runs get a
+    minimal module providing just that function.
+    """
+    try:
+        import folder_paths
+    except ImportError:
+        folder_paths = types.ModuleType("folder_paths")
+        sys.modules["folder_paths"] = folder_paths
+    folder_paths.get_temp_directory = lambda: temp_dir
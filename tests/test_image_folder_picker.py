@@ -0,0 +1,130 @@
+"""
+Tests for ImageFolderPicker tensor conversion, decoded-tensor cache and IS_CHANGED memo
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import torch
+from PIL import Image
+
+from support import import_node_module, use_temp_folder_paths
+
+_TEMP = tempfile.TemporaryDirectory()
+use_temp_folder_paths(_TEMP.name)
+image_folder_picker = import_node_module("image_folder_picker")
+
+ENTRY_BYTES = 10 * 10 * 3 * 4 + 10 * 10 * 4  # float32 10x10 RGB image + mask
+
+
+class AlphaMaskTests(unittest.TestCase):
+    
+    def test_mask_matches_one_minus_alpha(self):
+        # Bit-identical to the original 1.0 - alpha / 255.0 for every alpha value
+        alpha = np.arange(256, dtype=np.uint8).reshape(16, 16)
+        expected = 1.0 - torch.from_numpy(alpha.astype(np.float32) / 255.0)
+        self.assertTrue(torch.equal(image_folder_picker._alpha_to_mask(alpha), expected))
+    
+    def test_rgba_image(self):
+        img = Image.new('RGBA', (4, 2), (255, 128, 0, 51))
+        image, mask = image_folder_picker._image_to_tensors(img)
+        self.assertEqual(tuple(image.shape), (1, 2, 4, 3))
+        self.assertEqual(tuple(mask.shape), (1, 2, 4))
+        self.assertEqual(mask[0, 0, 0].item(), (1.0 - torch.tensor(51 / 255.0, dtype=torch.float32)).item())
+
+
+class TensorCacheTests(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(4):
+            path = os.path.join(self.tmp.name, f"{i}.png")
+            Image.new('RGB', (10, 10), (i * 60, 0, 0)).save(path)
+            self.paths.append(path)
+        self._clear_cache()
+    
+    def tearDown(self):
+        self._clear_cache()
+        self.tmp.cleanup()
+    
+    def _clear_cache(self):
+        with image_folder_picker._tensor_cache_lock:
+            image_folder_picker._tensor_cache.clear()
+            image_folder_picker._tensor_cache_bytes = 0
+    
+    def decode(self, path, mtime_ns=1, size=1, max_side=0):
+        return image_folder_picker._decode_image(path, mtime_ns, size, max_side)
+    
+    def cached_paths(self):
+        return [key[0] for key in image_folder_picker._tensor_cache]
+    
+    def test_hit_returns_cached_tensors(self):
+        first = self.decode(self.paths[0])
+        self.assertIs(self.decode(self.paths[0]), first)
+    
+    def test_changed_key_fields_miss(self):
+        first = self.decode(self.paths[0])
+        for changed in ({"mtime_ns": 2}, {"size": 2}, {"max_side": 8}):
+            with self.subTest(**changed):
+                self.assertIsNot(self.decode(self.paths[0], **changed), first)
+        self.assertEqual(len(image_folder_picker._tensor_cache), 4)
+    
+    def test_byte_cap_evicts_oldest_first(self):
+        with mock.patch.object(image_folder_picker, "TENSOR_CACHE_MAX_BYTES", ENTRY_BYTES * 2):
+            for path in self.paths[:3]:
+                self.decode(path)
+            self.assertEqual(self.cached_paths(), self.paths[1:3])
+            
+            # A hit refreshes recency, so the other entry goes next
+            self.decode(self.paths[1])
+            self.decode(self.paths[3])
+            self.assertEqual(self.cached_paths(), [self.paths[1], self.paths[3]])
+        self.assertEqual(image_folder_picker._tensor_cache_bytes, ENTRY_BYTES * 2)
+    
+    def test_newest_entry_kept_past_byte_cap(self):
+        with mock.patch.object(image_folder_picker, "TENSOR_CACHE_MAX_BYTES", ENTRY_BYTES // 2):
+            self.decode(self.paths[0])
+            self.decode(self.paths[1])
+            self.assertEqual(self.cached_paths(), [self.paths[1]])
+    
+    def test_entry_cap(self):
+        with mock.patch.object(image_folder_picker, "TENSOR_CACHE_MAX_ENTRIES", 2):
+            for path in self.paths:
+                self.decode(path)
+            self.assertEqual(self.cached_paths(), self.paths[2:])
+    
+    def test_zero_limit_disables_cache(self):
+        with mock.patch.object(image_folder_picker, "TENSOR_CACHE_MAX_BYTES", 0):
+            first = self.decode(self.paths[0])
+            self.assertIsNot(self.decode(self.paths[0]), first)
+        self.assertEqual(len(image_folder_picker._tensor_cache), 0)
+
+
+
+class IsChangedMemoTests(unittest.TestCase):
+    
+    def setUp(self):
+        self.picker = image_folder_picker.ImageFolderPicker
+        self.picker._last_key.clear()
+    
+    def tearDown(self):
+        self.picker._last_key.clear()
+    
+    def test_expired_entries_pruned_on_write(self):
+        with mock.patch.object(image_folder_picker.time, "monotonic", return_value=100.0):
+            for node in ("1", "2", "3"):
+                self.picker.IS_CHANGED(unique_id=node)
+        self.assertEqual(set(self.picker._last_key), {"1", "2", "3"})
+        
+        later = 100.0 + self.picker.IS_CHANGED_WINDOW
+        with mock.patch.object(image_folder_picker.time, "monotonic", return_value=later):
+            self.picker.IS_CHANGED(unique_id="4")
+        self.assertEqual(set(self.picker._last_key), {"4"})
+
+
+if __name__ == "__main__":
+    unittest.main()
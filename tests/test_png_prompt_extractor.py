@@ -0,0 +1,166 @@
+"""
+Regression tests for PNGPromptExtractor metadata reading and parsing
+"""
+
+import os
+import struct
+import tempfile
+import unittest
+import zlib
+
+from support import import_node_module
+
+png_prompt_extractor = import_node_module("png_prompt_extractor")
+
+
+def write_png(path, chunks):
+    """Write a 1x1 grayscale PNG with extra (type, payload) chunks before IDAT."""
+    def chunk(chunk_type, payload):
+        return (struct.pack('>I', len(payload)) + chunk_type + payload
+                + struct.pack('>I', zlib.crc32(chunk_type + payload) & 0xFFFFFFFF))
+    
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0)))
+        for chunk_type, payload in chunks:
+            f.write(chunk(chunk_type, payload))
+        f.write(chunk(b'IDAT', zlib.compress(b'\0\0')))
+        f.write(chunk(b'IEND', b''))
+
+
+class EmptyLinkTests(unittest.TestCase):
+    """Empty link lists on unrelated nodes must not hide the prompts."""
+    
+    def setUp(self):
+        self.extractor = png_prompt_extractor.PNGPromptExtractor()
+    
+    def test_empty_conditioning_link(self):
+        workflow = {
+            "1": {"class_type": "CLIPTextEncode", "inputs": {"text": "a cat"}},
+            "2": {"class_type": "CLIPTextEncode", "inputs": {"text": "blurry"}},
+            "3": {"class_type": "KSampler", "inputs": {"positive": ["1", 0], "negative": ["2", 0]}},
+            "4": {"class_type": "ConditioningZeroOut", "inputs": {"conditioning": []}},
+        }
+        self.assertEqual(self.extractor._extract_comfyui_prompts(workflow), ("a cat", "blurry"))
+    
+    def test_empty_sampler_and_guider_links(self):
+        workflow = {
+            "1": {"class_type": "CLIPTextEncode", "inputs": {"text": "a cat"}},
+            "2": {"class_type": "CFGGuider", "inputs": {"positive": [], "negative": []}},
+            "3": {"class_type": "SamplerCustomAdvanced", "inputs": {"guider": ["2", 0]}},
+            "4": {"class_type": "KSampler", "inputs": {"positive": ["1", 0], "negative": []}},
+            "5": {"class_type": "SamplerCustom", "inputs": {"guider": []}},
+        }
+        self.assertEqual(self.extractor._extract_comfyui_prompts(workflow), ("a cat", ""))
+
+
+
+class A1111PromptsTests(unittest.TestCase):
+    """Positive/negative split of A1111 parameters text."""
+    
+    def setUp(self):
+        self.extractor = png_prompt_extractor.PNGPromptExtractor()
+    
+    def prompts(self, text):
+        return self.extractor._extract_a1111_prompts(text)
+    
+    def test_positive_and_negative(self):
+        text = "a cat,\nsitting\nNegative prompt: blurry,\nlow quality\nSteps: 20, Seed: 1"
+        self.assertEqual(self.prompts(text), ("a cat,\nsitting", "blurry,\nlow quality"))
+    
+    def test_no_negative(self):
+        self.assertEqual(self.prompts("a cat\nSteps: 20, Seed: 1"), ("a cat\nSteps: 20, Seed: 1", ""))
+    
+    def test_empty_negative_before_steps(self):
+        # The settings line is not the negative prompt
+        self.assertEqual(self.prompts("a cat\nNegative prompt: \nSteps: 20, Seed: 1"), ("a cat", ""))
+    
+    def test_negative_without_steps(self):
+        self.assertEqual(self.prompts("a cat\nNegative prompt: blurry\n"), ("a cat", "blurry"))
+    
+    def test_negative_ends_at_first_steps_line(self):
+        text = "a cat\nNegative prompt: blurry\nSteps: 20\nSteps: 30"
+        self.assertEqual(self.prompts(text), ("a cat", "blurry"))
+
+
+class A1111ParamsTests(unittest.TestCase):
+    """Generation parameters from the A1111 "Steps:" settings line."""
+    
+    def setUp(self):
+        self.extractor = png_prompt_extractor.PNGPromptExtractor()
+    
+    def params(self, text):
+        return self.extractor._extract_a1111_params(text)
+    
+    def test_settings_line(self):
+        text = ("a cat\nNegative prompt: blurry\n"
+                "Steps: 20, Sampler: DPM++ 2M, Schedule type: Karras, CFG scale: 5.5, "
+                "Seed: 1234, Size: 512x768, Model hash: abc123, Model: sdxl")
+        self.assertEqual(self.params(text), ("DPM++ 2M", "Karras", "5.5", "1234"))
+    
+    def test_prompt_text_mentioning_fields(self):
+        # Only the settings line counts, not "Seed:" or "Sampler:" inside the prompts
+        text = ("poster text Seed: 42, Sampler: none\nNegative prompt: CFG scale: 99\n"
+                "Steps: 30, Sampler: Euler a, CFG scale: 7, Seed: 1234")
+        self.assertEqual(self.params(text), ("Euler a", "", "7", "1234"))
+    
+    def test_quoted_values_with_commas(self):
+        text = ("a cat\nSteps: 25, Sampler: UniPC, Schedule type: Exponential, CFG scale: 4, "
+                'Seed: 99, Lora hashes: "detail: 1a2b, Seed: 7, style: 3c4d", Version: v1.9.4')
+        self.assertEqual(self.params(text), ("UniPC", "Exponential", "4", "99"))
+    
+    def test_missing_schedule_type(self):
+        text = "a cat\nSteps: 20, Sampler: Euler, CFG scale: 7, Seed: 5, Size: 512x512"
+        self.assertEqual(self.params(text), ("Euler", "", "7", "5"))
+    
+    def test_lines_after_settings(self):
+        text = "a cat\nSteps: 20, Sampler: Euler, CFG scale: 7, Seed: 5\nTemplate: a {cat}"
+        self.assertEqual(self.params(text), ("Euler", "", "7", "5"))
+    
+    def test_regex_fallback_without_steps_line(self):
+        text = "a cat\nSampler: Euler, Schedule type: Simple, CFG scale: 6.5, Seed: 77"
+        self.assertEqual(self.params(text), ("Euler", "Simple", "6.5", "77"))
+    
+    def test_no_parameters(self):
+        self.assertEqual(self.params("just a prompt"), ("", "", "", ""))
+
+
+class TextChunkTests(unittest.TestCase):
+    """Direct tEXt/zTXt/iTXt reading."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "test.png")
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_compressed_chunks(self):
+        write_png(self.path, [
+            (b'zTXt', b'parameters\0\0' + zlib.compress(b'a cat\nSteps: 20')),
+            (b'iTXt', b'prompt\0\1\0\0\0' + zlib.compress('{"1": "\u00e9"}'.encode('utf-8'))),
+        ])
+        self.assertEqual(png_prompt_extractor._read_png_text(self.path),
+                         {"parameters": "a cat\nSteps: 20", "prompt": '{"1": "\u00e9"}'})
+    
+    def test_oversized_ztxt_is_malformed(self):
+        # A few KB on disk that would inflate far past the limit
+        bomb = zlib.compress(b' ' * (png_prompt_extractor._MAX_TEXT_CHUNK * 8), 9)
+        write_png(self.path, [(b'zTXt', b'parameters\0\0' + bomb)])
+        with self.assertRaises(ValueError):
+            png_prompt_extractor._read_png_text(self.path)
+    
+    def test_oversized_itxt_is_malformed(self):
+        bomb = zlib.compress(b' ' * (png_prompt_extractor._MAX_TEXT_CHUNK * 8), 9)
+        write_png(self.path, [(b'iTXt', b'prompt\0\1\0\0\0' + bomb)])
+        with self.assertRaises(ValueError):
+            png_prompt_extractor._read_png_text(self.path)
+    
+    def test_text_at_limit_is_read(self):
+        text = b' ' * png_prompt_extractor._MAX_TEXT_CHUNK
+        write_png(self.path, [(b'zTXt', b'parameters\0\0' + zlib.compress(text))])
+        self.assertEqual(len(png_prompt_extractor._read_png_text(self.path)["parameters"]), len(text))
+
+
+if __name__ == "__main__":
+    unittest.main()
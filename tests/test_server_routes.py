@@ -0,0 +1,185 @@
+"""
+Tests for the server_routes helpers that don't need a running server
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+from support import import_node_module, use_temp_folder_paths
+
+_TEMP = tempfile.TemporaryDirectory()
+use_temp_folder_paths(_TEMP.name)
+server_routes = import_node_module("server_routes")
+folder_watcher = import_node_module("folder_watcher")
+
+SIZE = (333, 217)  # Odd sizes catch byte order and off-by-one mistakes
+
+
+class ReadImageSizeTests(unittest.TestCase):
+    """read_image_size must agree with Pillow, or return None so the caller falls back."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def save(self, name, mode='RGB', **params):
+        path = os.path.join(self.tmp.name, name)
+        Image.new(mode, SIZE).save(path, **params)
+        return path
+    
+    def assert_size(self, path):
+        with Image.open(path) as img:
+            self.assertEqual(img.size, SIZE)
+        self.assertEqual(server_routes.read_image_size(path), SIZE)
+    
+    def truncate(self, path, length):
+        with open(path, 'rb') as f:
+            data = f.read(length)
+        with open(path, 'wb') as f:
+            f.write(data)
+    
+    def test_png(self):
+        self.assert_size(self.save('a.png'))
+    
+    def test_jpeg_baseline(self):
+        self.assert_size(self.save('a.jpg'))
+    
+    def test_jpeg_progressive(self):
+        self.assert_size(self.save('a.jpg', progressive=True))
+    
+    def test_jpeg_cmyk(self):
+        self.assert_size(self.save('a.jpg', mode='CMYK'))
+    
+    def test_jpeg_with_exif(self):
+        # An APP1 segment ahead of the frame header must be skipped
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        self.assert_size(self.save('a.jpg', exif=exif.tobytes()))
+    
+    def test_gif(self):
+        self.assert_size(self.save('a.gif', mode='P'))
+    
+    def test_webp_vp8(self):
+        path = self.save('a.webp', quality=80)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(16)[12:], b'VP8 ')
+        self.assert_size(path)
+    
+    def test_webp_vp8l(self):
+        path = self.save('a.webp', lossless=True)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(16)[12:], b'VP8L')
+        self.assert_size(path)
+    
+    def test_webp_vp8x(self):
+        path = self.save('a.webp', mode='RGBA', quality=80)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(16)[12:], b'VP8X')
+        self.assert_size(path)
+    
+    def test_truncated_headers(self):
+        for name, length in (('a.png', 20), ('a.jpg', 100), ('a.gif', 8), ('a.webp', 25)):
+            with self.subTest(name=name):
+                path = self.save(name, mode='RGBA' if name == 'a.png' else 'RGB')
+                self.truncate(path, length)
+                self.assertIsNone(server_routes.read_image_size(path))
+    
+    def test_truncated_after_header(self):
+        # Only the pixel data is missing - the header still has the size, as for Pillow
+        path = self.save('a.png')
+        self.truncate(path, 40)
+        self.assertEqual(server_routes.read_image_size(path), SIZE)
+    
+    def test_other_formats_fall_back(self):
+        for name in ('a.bmp', 'a.tiff'):
+            with self.subTest(name=name):
+                self.assertIsNone(server_routes.read_image_size(self.save(name)))
+
+
+
+@unittest.skipUnless(folder_watcher.WATCHDOG_AVAILABLE, "listings are only cached for watched folders")
+class ListCacheTests(unittest.TestCase):
+    """list_folder reuses a listing only while the watcher generation is unchanged."""
+    
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        Image.new('RGB', (10, 10)).save(os.path.join(self.folder, 'a.png'))
+        
+        self.manager = folder_watcher.FolderWatcherManager()
+        self.previous = folder_watcher.FolderWatcherManager._instance
+        folder_watcher.FolderWatcherManager._instance = self.manager
+        self.assertTrue(self.manager.watch_folder(self.folder))
+        server_routes._list_cache.clear()
+        
+        self.scans = 0
+        scan_folder = server_routes.scan_folder
+        def counting_scan(*args):
+            self.scans += 1
+            return scan_folder(*args)
+        patcher = mock.patch.object(server_routes, "scan_folder", counting_scan)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        folder_watcher.FolderWatcherManager._instance = self.previous
+        self.manager.shutdown()
+        server_routes._list_cache.clear()
+        self.tmp.cleanup()
+    
+    def test_unchanged_folder_is_cached(self):
+        first = server_routes.list_folder(self.folder)
+        self.assertIs(server_routes.list_folder(self.folder), first)
+        self.assertEqual(self.scans, 1)
+    
+    def test_generation_bump_rescans(self):
+        server_routes.list_folder(self.folder)
+        self.manager._bump_generation(self.folder)
+        server_routes.list_folder(self.folder)
+        self.assertEqual(self.scans, 2)
+    
+    def test_bump_during_scan_rescans_next_time(self):
+        # An event landing while the folder is being read must not be hidden by the cache
+        read_image_size = server_routes.read_image_size
+        def bump_then_read(path):
+            self.manager._bump_generation(self.folder)
+            return read_image_size(path)
+        
+        with mock.patch.object(server_routes, "read_image_size", bump_then_read):
+            server_routes.list_folder(self.folder)
+        server_routes.list_folder(self.folder)
+        self.assertEqual(self.scans, 2)
+        
+        # Nothing changed since the second scan
+        server_routes.list_folder(self.folder)
+        self.assertEqual(self.scans, 2)
+    
+    def test_reading_files_does_not_bump_generation(self):
+        # Access events come from our own reads (listing headers, thumbnails)
+        from watchdog import events
+        handler = self.manager._handlers[os.path.normpath(os.path.abspath(self.folder))]
+        path = os.path.join(self.folder, 'a.png')
+        before = self.manager.change_generation(self.folder)
+        for name in ('FileOpenedEvent', 'FileClosedNoWriteEvent'):
+            if hasattr(events, name):
+                handler.on_any_event(getattr(events, name)(path))
+        self.assertEqual(self.manager.change_generation(self.folder), before)
+        
+        handler.on_any_event(events.FileModifiedEvent(path))
+        self.assertEqual(self.manager.change_generation(self.folder), before + 1)
+    
+    def test_unwatched_folder_is_not_cached(self):
+        self.manager.unwatch_folder(self.folder)
+        server_routes.list_folder(self.folder)
+        server_routes.list_folder(self.folder)
+        self.assertEqual(self.scans, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
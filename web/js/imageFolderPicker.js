@@ -38,22 +38,26 @@ api.addEventListener("executing", async (event) => {
 });
 
 // Listen for folder change events from Python (via WebSocket)
-api.addEventListener("imagefolderpicker.folder_changed", (event) => {
-    const changedFolder = event.detail?.folder;
-    if (!changedFolder) return;
+// All folders changed within one debounce window arrive in a single message
+api.addEventListener("imagefolderpicker.folders_changed", (event) => {
+    const changedFolders = event.detail?.folders;
+    if (!changedFolders?.length) return;
     
-    // Find all ImageFolderPicker nodes and refresh those watching this folder
+    // Normalize paths for comparison (handle slashes)
+    const normalizedChanged = new Set(
+        changedFolders.map(f => f.replace(/\\/g, '/').toLowerCase())
+    );
+    
+    // Find all ImageFolderPicker nodes and refresh those watching a changed folder
     for (const node of app.graph._nodes || []) {
         if (node.type !== "ImageFolderPicker") continue;
         
         for (let i = 0; i < 5; i++) {
             try {
                 const watchedFolder = node.getFolderPath?.(i);
-                // Normalize paths for comparison (handle slashes)
                 const normalizedWatched = watchedFolder?.replace(/\\/g, '/').toLowerCase() || '';
-                const normalizedChanged = changedFolder.replace(/\\/g, '/').toLowerCase();
                 
-                if (normalizedWatched === normalizedChanged) {
+                if (normalizedChanged.has(normalizedWatched)) {
                     node.loadImages(i);
                 }
             } catch (e) {